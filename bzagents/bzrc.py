@@ -337,6 +337,12 @@ class BZRC:
         self.read_ack()
         return self.read_bool()
 
+    def step(self):
+        """Wait for the game to advance (server must run with --lockstep)."""
+        self.sendline('step')
+        self.read_ack()
+        return self.read_bool()
+
     # Information Requests:
 
     def get_teams(self):
@@ -29,6 +29,7 @@ __license__ = "GNU GPL"
 
 import logging
 import os
+import signal
 
 import config
 import game
@@ -47,4 +48,6 @@ def run():
     fname = config_file.get('debug_out', None)
     logging.basicConfig(level=level, filename=fname)
     g = game.GameLoop(config_file)
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, g.report_phases)
     g.loop()
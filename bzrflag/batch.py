@@ -0,0 +1,195 @@
+# Bzrflag
+# Copyright 2008-2011 Brigham Young University
+#
+# This file is part of Bzrflag.
+#
+# Bzrflag is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Bzrflag is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bzrflag.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Inquiries regarding any further use of Bzrflag, please contact the Copyright
+# Licensing Office, Brigham Young University, 3760 HBLL, Provo, UT 84602,
+# (801) 422-9339 or 422-3821, e-mail copyright@byu.edu.
+
+"""Run many independent BZRFlag games on a process pool (bzrflag-batch).
+
+The games are described by a JSON matrix file::
+
+    {
+        "maps": ["maps/four_ls.bzw", "maps/rotated_box_world.bzw"],
+        "seeds": [1, 2, 3],
+        "teams": [
+            {"red": "python bzagents/agent0.py {host} {port}",
+             "blue": "python bzagents/pfield_agent.py {host} {port}"}
+        ],
+        "options": ["--time-limit=120", "--lockstep=1"]
+    }
+
+One game is played for every combination of map, seed and team setup.
+Each game runs headless in its own worker process.  Every team server
+listens on a port the OS picks, and the agent commands are started with
+{host}, {port} and {color} filled in.  The final Score.total() of each
+team is written, with the game's parameters, to a JSON results file.
+
+"""
+__author__ = "BYU AML Lab <kseppi@byu.edu>"
+__copyright__ = "Copyright 2008-2011 Brigham Young University"
+__license__ = "GNU GPL"
+
+import os
+import sys
+import json
+import time
+import shlex
+import asyncore
+import logging
+import optparse
+import subprocess
+import multiprocessing
+
+import config
+import constants
+import game
+
+logger = logging.getLogger('batch')
+
+HOST = 'localhost'
+
+
+def expand_matrix(matrix):
+    """Return one job for every combination of map, seed and team setup."""
+    if not matrix.get('maps'):
+        raise config.ArgumentError('the batch matrix lists no maps')
+    jobs = []
+    for world in matrix['maps']:
+        for seed in matrix.get('seeds', [-1]):
+            for teams in matrix.get('teams', [{}]):
+                jobs.append({'map': str(world),
+                             'seed': int(seed),
+                             'teams': dict((str(color), str(command))
+                                           for color, command in teams.items()),
+                             'options': [str(o)
+                                         for o in matrix.get('options', [])]})
+    return jobs
+
+
+def game_args(job):
+    """Build the bzrflag command line for a job.
+
+    Every team port is forced to 0 so that concurrent games never collide.
+    """
+    args = ['--world=%s' % job['map'], '--seed=%d' % job['seed'],
+            '--headless']
+    args.extend(job['options'])
+    args.extend('--%s-port=0' % color for color in constants.COLORNAME[1:])
+    return args
+
+
+def run_game(job):
+    """Play the game described by job and return its result record."""
+    game_loop = game.GameLoop(config.Config(game_args(job)))
+    game_loop.start_servers()
+    devnull = open(os.devnull, 'w')
+    agents = []
+    started = time.time()
+    try:
+        for color, command in sorted(job['teams'].items()):
+            if color not in game_loop.servers:
+                raise config.ArgumentError('map %s has no %s team'
+                                           % (job['map'], color))
+            port = game_loop.servers[color].get_port()
+            args = shlex.split(command.format(host=HOST, port=port,
+                                              color=color))
+            agents.append(subprocess.Popen(args, stdout=devnull,
+                                           stderr=devnull))
+        game_loop.loop()
+    finally:
+        for agent in agents:
+            if agent.poll() is None:
+                agent.terminate()
+            agent.wait()
+        devnull.close()
+        asyncore.close_all()
+    result = dict(job)
+    result['scores'] = dict((color, team.score.total())
+                            for color, team in game_loop.game.teams.items())
+    result['ticks'] = game_loop.ticks
+    result['elapsed'] = time.time() - started
+    return result
+
+
+def run_job(job):
+    """Pool worker: run_game, recording any failure in the result."""
+    try:
+        return run_game(job)
+    except Exception, e:
+        logger.exception('game failed: %s', job)
+        result = dict(job)
+        result['error'] = '%s: %s' % (e.__class__.__name__, e)
+        return result
+
+
+def _init_worker():
+    # Results go to the results file; keep the per-game output quiet.
+    sys.stdout = open(os.devnull, 'w')
+
+
+def run_batch(jobs, workers=None):
+    """Run the jobs on a pool of worker processes; return their results.
+
+    Each worker process plays a single game, so no sockets or random state
+    are shared between games.
+    """
+    pool = multiprocessing.Pool(workers, _init_worker, maxtasksperchild=1)
+    try:
+        # A timeout on get() keeps the parent interruptible with Ctrl-C.
+        results = pool.map_async(run_job, jobs, 1).get(1e9)
+    except KeyboardInterrupt:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+    return results
+
+
+def parse_args(args):
+    p = optparse.OptionParser(usage='%prog [options] MATRIX')
+    p.add_option('-j', '--workers', type='int',
+        help='number of games to run at once (default: one per core)')
+    p.add_option('-o', '--output', default='results.json',
+        help='file to write the results to (default: %default)')
+    options, args = p.parse_args(args)
+    if len(args) != 1:
+        p.error('expected exactly one matrix file')
+    if options.workers is not None and options.workers < 1:
+        p.error('--workers must be at least 1')
+    return options, args[0]
+
+
+def main(args=None):
+    """Entry point for bin/bzrflag-batch."""
+    options, matrix_file = parse_args(args)
+    logging.basicConfig(level=logging.WARNING)
+    jobs = expand_matrix(json.load(open(matrix_file)))
+    workers = options.workers or multiprocessing.cpu_count()
+    print 'running %d games on %d workers' % (len(jobs), workers)
+    started = time.time()
+    results = run_batch(jobs, workers)
+    with open(options.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    failed = len([r for r in results if 'error' in r])
+    print '%d games (%d failed) in %.1f seconds; results in %s' % (
+            len(results), failed, time.time() - started, options.output)
+
+# vim: et sw=4 sts=4
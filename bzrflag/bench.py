@@ -0,0 +1,303 @@
+# Bzrflag
+# Copyright 2008-2011 Brigham Young University
+#
+# This file is part of Bzrflag.
+#
+# Bzrflag is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Bzrflag is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bzrflag.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Inquiries regarding any further use of Bzrflag, please contact the Copyright
+# Licensing Office, Brigham Young University, 3760 HBLL, Provo, UT 84602,
+# (801) 422-9339 or 422-3821, e-mail copyright@byu.edu.
+
+"""Collision and physics micro-benchmarks over the maps (bzrflag-bench).
+
+Every map is loaded once for each density (tanks per team).  The tanks
+are scattered over the free parts of the map, given random speeds and
+turns, and a share of them fire, all from a fixed seed.  The collision
+primitives are then timed on the work that layout gives them (each tank
+and shot path against the obstacles near it, each tank against the tanks
+near it), followed by a run of Game.update.  Results are written as JSON::
+
+    {"seed": 1, "engine": "python", "timestep": 0.1, "ticks": 20,
+     "maps": {"hexmaze.bzw": {"obstacles": 319, "densities": [
+         {"tanks_per_team": 10, "tanks": 40, "shots": 20,
+          "primitives": {"circle_to_poly": {"ops": 512,
+                                            "seconds_per_op": 7.8e-06,
+                                            "ops_per_sec": 128000.0}, ...},
+          "update": {"ticks": 20, "seconds_per_tick": 0.003,
+                     "ticks_per_sec": 333.3,
+                     "phases": {"shots": {"p50": ...}, ...}}}, ...]}}}
+
+ops is the size of a primitive's workload.  Each primitive is timed
+`repeat` times, going over its workload for at least MIN_TIME each time,
+and the fastest time is reported.  A primitive with no work on a map has
+null times.  The phases of update are in seconds, as stats.Phases gives
+them.
+
+"""
+__author__ = "BYU AML Lab <kseppi@byu.edu>"
+__copyright__ = "Copyright 2008-2011 Brigham Young University"
+__license__ = "GNU GPL"
+
+import os
+import sys
+import glob
+import json
+import math
+import random
+import logging
+import optparse
+import timeit
+
+import collisiontest
+import config
+import constants
+import game
+import paths
+import stats
+
+logger = logging.getLogger('bench')
+
+DENSITIES = (5, 20, 80)
+# Shortest time a primitive is run for in one timing run, in seconds.
+MIN_TIME = 0.02
+
+
+def make_game(world, tanks, seed, engine='python', timestep=constants.TIMESTEP):
+    """Load a headless game on world with the given tanks per team."""
+    args = ['--test', '--max-speed', '--world=%s' % world,
+            '--default-tanks=%d' % tanks, '--seed=%d' % seed,
+            '--engine=%s' % engine, '--timestep=%s' % timestep]
+    game_loop = game.GameLoop(config.Config(args))
+    game_loop.step_game(0)
+    return game_loop.game
+
+
+def populate(g, seed, shots=0.5, tries=50):
+    """Scatter the tanks of g over the map, set them moving and fire.
+
+    Each tank is put at a random spot clear of obstacles and other tanks
+    (it stays at its spawn spot if none is found in `tries`), given a
+    random heading, speed and turn, and fires with probability `shots`.
+    """
+    rng = random.Random(seed)
+    width, height = g.config.world.size
+    rad = constants.TANKRADIUS
+    for color, team in sorted(g.teams.items()):
+        for tankid, tank in enumerate(team.tanks):
+            for i in xrange(tries):
+                pos = [rng.uniform(rad - width/2, width/2 - rad),
+                       rng.uniform(rad - height/2, height/2 - rad)]
+                if (team.clear_of_obstacles(pos, rad) and
+                    team.clear_of_objects(pos, rad, ())):
+                    tank.pos = pos
+                    g.tank_hash.move(tank, pos)
+                    team.score.moved.add(tank)
+                    break
+            tank.rot = rng.uniform(0, 2 * math.pi)
+            team.speed(tankid, rng.uniform(-1, 1))
+            team.angvel(tankid, rng.uniform(-1, 1))
+            if rng.random() < shots:
+                team.shoot(tankid)
+
+
+def timed(func, work, repeat, min_time=MIN_TIME):
+    """Time func(*args) for each args in work.
+
+    Each of the `repeat` runs goes over the work as many times as it takes
+    to fill min_time seconds.  Returns {'ops', 'seconds_per_op',
+    'ops_per_sec'} for the fastest run, where ops is len(work).
+    """
+    result = {'ops': len(work), 'seconds_per_op': None, 'ops_per_sec': None}
+    if not work:
+        return result
+    best = None
+    for i in xrange(repeat):
+        loops = 0
+        start = timeit.default_timer()
+        while True:
+            for args in work:
+                func(*args)
+            loops += 1
+            elapsed = timeit.default_timer() - start
+            if elapsed >= min_time:
+                break
+        per_op = elapsed / (loops * len(work))
+        if best is None or per_op < best:
+            best = per_op
+    result['seconds_per_op'] = best
+    if best:
+        result['ops_per_sec'] = 1 / best
+    return result
+
+
+def workloads(g, dt):
+    """Return the inputs of each primitive for the layout of g.
+
+    Returns (name, function, [args, ...]) triples.
+    """
+    t_rad = constants.TANKRADIUS
+    s_rad = constants.SHOTRADIUS
+    tree = g.obstacle_tree
+    tanks = [t for t in g.tanks() if t.status == constants.TANKALIVE]
+    shot_paths = []
+    for shot in g.shots():
+        (x, y), (vx, vy) = shot.pos, shot.vel
+        shot_paths.append(((x, y), (x + vx*dt, y + vy*dt)))
+
+    circles = []
+    for tank in tanks:
+        x, y = tank.pos
+        for obs in tree.query_box(x - t_rad, y - t_rad, x + t_rad, y + t_rad):
+            circles.append((tuple(tank.pos), obs))
+    segments = []
+    for p1, p2 in shot_paths:
+        box = (min(p1[0], p2[0]) - s_rad, min(p1[1], p2[1]) - s_rad,
+               max(p1[0], p2[0]) + s_rad, max(p1[1], p2[1]) + s_rad)
+        for obs in tree.query_box(*box):
+            segments.append(((p1, p2), obs))
+    neighbours = []
+    for tank in tanks:
+        for other in g.tank_hash.query(tank.pos, 2 * t_rad):
+            if other is not tank:
+                neighbours.append(((tank.pos, t_rad), (other.pos, t_rad)))
+
+    work = [
+        ('point_in_poly', collisiontest.point_in_poly,
+         [(pos, obs.shape) for pos, obs in circles]),
+        ('Geometry.contains', lambda pos, geo: geo.contains(pos),
+         [(pos, obs.geometry) for pos, obs in circles]),
+        ('circle_to_poly', collisiontest.circle_to_poly,
+         [((pos, t_rad), obs.shape) for pos, obs in circles]),
+        ('Geometry.hits_circle', lambda pos, geo: geo.hits_circle(pos, t_rad),
+         [(pos, obs.geometry) for pos, obs in circles]),
+        ('line_cross_poly', collisiontest.line_cross_poly,
+         [(line, obs.shape) for line, obs in segments]),
+        ('Geometry.crosses_line', lambda line, geo: geo.crosses_line(line),
+         [(line, obs.geometry) for line, obs in segments]),
+        ('sweep_circle_to_poly', collisiontest.sweep_circle_to_poly,
+         [(line, s_rad, obs.shape) for line, obs in segments]),
+        ('circle_to_circle', collisiontest.circle_to_circle, neighbours),
+        ('ObstacleRaster.hits_circle', g.obstacle_raster.hits_circle,
+         [(tank.pos, t_rad) for tank in tanks]),
+        ('ObstacleTree.circle', lambda pos: list(tree.circle(pos, t_rad)),
+         [(tank.pos,) for tank in tanks]),
+        ('Game.sweep', g.sweep, [(dt,)]),
+    ]
+    if collisiontest.numpy is not None and tanks:
+        centers = [tank.pos for tank in tanks]
+        work.append(('circles_to_poly', lambda shape:
+                     collisiontest.circles_to_poly(centers, t_rad, shape),
+                     [(obs.shape,) for obs in g.obstacles]))
+    return work
+
+
+def run_density(world, tanks, seed, ticks, repeat, shots, engine, timestep):
+    """Benchmark one map at one density; return its result record."""
+    g = make_game(world, tanks, seed, engine, timestep)
+    populate(g, seed, shots)
+    result = {'tanks_per_team': tanks,
+              'tanks': len(list(g.tanks())),
+              'shots': len(list(g.shots())),
+              'primitives': {}}
+    for name, func, work in workloads(g, timestep):
+        result['primitives'][name] = timed(func, work, repeat)
+    g.contacts = None
+
+    g.phases = stats.Phases()
+    start = timeit.default_timer()
+    for i in xrange(ticks):
+        g.update(timestep)
+    elapsed = timeit.default_timer() - start
+    update = {'ticks': ticks, 'seconds_per_tick': None,
+              'ticks_per_sec': None, 'phases': g.phases.summary()}
+    if ticks:
+        update['seconds_per_tick'] = elapsed / ticks
+        if elapsed:
+            update['ticks_per_sec'] = ticks / elapsed
+    result['update'] = update
+    return result
+
+
+def run(maps, densities=DENSITIES, seed=1, ticks=20, repeat=3, shots=0.5,
+        engine='python', timestep=constants.TIMESTEP):
+    """Benchmark every map at every density; return the results."""
+    results = {'seed': seed, 'engine': engine, 'timestep': timestep,
+               'ticks': ticks, 'repeat': repeat, 'min_time': MIN_TIME,
+               'shots': shots,
+               'python': sys.version.split()[0], 'maps': {}}
+    for world in maps:
+        name = os.path.basename(world)
+        logger.info('benchmarking %s' % name)
+        boxes = config.Config(['--test', '--world=%s' % world]).world.boxes
+        record = {'obstacles': len(boxes), 'densities': []}
+        for tanks in densities:
+            record['densities'].append(run_density(
+                    world, tanks, seed, ticks, repeat, shots, engine,
+                    timestep))
+        results['maps'][name] = record
+    return results
+
+
+def parse_args(args):
+    p = optparse.OptionParser(usage='%prog [options] [MAP...]')
+    p.add_option('--densities', default=','.join(map(str, DENSITIES)),
+        help='comma-separated tanks per team to try (default: %default)')
+    p.add_option('--seed', type='int', default=1,
+        help='seed for the layouts (default: %default)')
+    p.add_option('--ticks', type='int', default=20,
+        help='Game.update calls to time per density (default: %default)')
+    p.add_option('--repeat', type='int', default=3,
+        help='runs of each primitive; the best is kept (default: %default)')
+    p.add_option('--shots', type='float', default=0.5,
+        help='share of the tanks that fire (default: %default)')
+    p.add_option('--engine', choices=['python', 'numpy'], default='python',
+        help='engine for the games (default: %default)')
+    p.add_option('--timestep', type='float', default=constants.TIMESTEP,
+        help='seconds per update (default: %default)')
+    p.add_option('-o', '--output', default='-',
+        help='file to write the JSON results to (default: stdout)')
+    options, maps = p.parse_args(args)
+    try:
+        options.densities = [int(d) for d in options.densities.split(',')]
+    except ValueError:
+        p.error('--densities must be a comma-separated list of integers')
+    if not options.densities or min(options.densities) < 1:
+        p.error('--densities must all be at least 1')
+    if options.ticks < 0 or options.repeat < 1:
+        p.error('--ticks must not be negative and --repeat must be at least 1')
+    if not 0 <= options.shots <= 1:
+        p.error('--shots must be between 0 and 1')
+    if options.timestep <= 0:
+        p.error('--timestep must be positive')
+    if not maps:
+        maps = sorted(glob.glob(os.path.join(paths.MAPS_DIR, '*.bzw')))
+    return options, maps
+
+
+def main(args=None):
+    """Entry point for bin/bzrflag-bench."""
+    options, maps = parse_args(args)
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    results = run(maps, options.densities, options.seed, options.ticks,
+                  options.repeat, options.shots, options.engine,
+                  options.timestep)
+    if options.output == '-':
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print
+    else:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+# vim: et sw=4 sts=4
@@ -29,6 +29,12 @@ circle : ((x,y),r)
 rectangle : (x,y,w,h)
 polygon : ((x1,y1),(x2,y2),(x3,y3)...(xn,yn))
 
+The functions with plural names test many shapes at once.  They take
+sequences or NumPy arrays of points (shape (N, 2)), radii (a number or
+shape (N,)) and segments (shape (N, 2, 2)), and return NumPy arrays
+computed in floating point.  They need NumPy, and give the same answers as
+the scalar functions, which remain the reference.
+
 """
 
 __author__ = "BYU AML Lab <kseppi@byu.edu>"
@@ -38,6 +44,11 @@ __license__ = "GNU GPL"
 import math
 import logging
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 logger = logging.getLogger('collisiontest.py')
 
 
@@ -53,8 +64,8 @@ def point_in_rect(point, rect):
     False
     """
     (x, y, w, h) = rect
-    poly = ((x,y), (x,y+h), (x+w,y+h), (x+w,y))
-    return point_in_poly(point, poly)
+    return (min(x, x+w) < point[0] <= max(x, x+w) and
+            min(y, y+h) < point[1] <= max(y, y+h))
 
 
 def point_in_poly(point, poly):
@@ -106,8 +117,17 @@ def line_cross_rect(line, rect):
     True
     """
     (x, y, w, h) = rect
+    if point_in_rect(line[0], rect) or point_in_rect(line[1], rect):
+        return True
+    (ax, ay), (bx, by) = line
+    if (max(ax, bx) < min(x, x+w) or min(ax, bx) > max(x, x+w) or
+        max(ay, by) < min(y, y+h) or min(ay, by) > max(y, y+h)):
+        return False
     poly = ((x,y), (x,y+h), (x+w,y+h), (x+w,y))
-    return line_cross_poly(line, poly)
+    for i,point in enumerate(poly):
+        if line_cross_line((point,poly[i-1]), line):
+            return True
+    return False
 
 
 def line_cross_poly(line, poly):
@@ -186,8 +206,9 @@ def circle_to_rect(circle, rect):
     False
     """
     (x, y, w, h) = rect
-    poly = ((x,y), (x,y+h), (x+w,y+h), (x+w,y))
-    return circle_to_poly(circle, poly)
+    (cx, cy), r = circle
+    return math.hypot(max(min(x, x+w) - cx, 0, cx - max(x, x+w)),
+                      max(min(y, y+h) - cy, 0, cy - max(y, y+h))) <= r
 
 
 def circle_to_poly(circle, poly):
@@ -277,6 +298,413 @@ def dist_to_line(point, line):
             return CB_length
 
 
+def sweep_circle_to_circle(line, radius, circle):
+    """Find when a circle moving along line first touches another circle.
+
+    The moving circle has the given radius and its center travels from
+    line[0] (t=0) to line[1] (t=1).
+
+    @return: The first t in [0, 1] at which the circles touch, or None.
+
+    >>> sweep_circle_to_circle(((0,0), (10,0)), 1, ((5,0), 1))
+    0.3
+    >>> sweep_circle_to_circle(((0,0), (10,0)), 1, ((5,3), 1)) is None
+    True
+    >>> sweep_circle_to_circle(((5,1), (10,0)), 1, ((5,0), 1))
+    0.0
+    """
+    (ax,ay),(bx,by) = line
+    (cx,cy),r = circle
+    r += radius
+    dx, dy = bx-ax, by-ay
+    fx, fy = ax-cx, ay-cy
+    c = fx*fx + fy*fy - r*r
+    if c <= 0:
+        return 0.0
+    a = dx*dx + dy*dy
+    b = fx*dx + fy*dy
+    if a == 0 or b >= 0:
+        return None
+    disc = b*b - a*c
+    if disc < 0:
+        return None
+    t = (-b - math.sqrt(disc))/a
+    if t > 1:
+        return None
+    return t
+
+
+def sweep_circle_to_poly(line, radius, poly):
+    """Find when a circle moving along line first touches a polygon.
+
+    The moving circle has the given radius and its center travels from
+    line[0] (t=0) to line[1] (t=1).  The first contact is either with one of
+    the polygon's edges pushed out by radius or with a circle of the given
+    radius around one of its corners.
+
+    @return: The first t in [0, 1] at which they touch, or None.
+
+    >>> poly = ((0,0), (0,4), (4,4), (4,0))
+    >>> sweep_circle_to_poly(((-5,2), (5,2)), 1, poly)
+    0.4
+    >>> sweep_circle_to_poly(((-5,6), (5,6)), 1, poly) is None
+    True
+    >>> sweep_circle_to_poly(((-2,6), (0,4)), 1, poly) == 1 - 1/math.sqrt(8)
+    True
+    >>> sweep_circle_to_poly(((2,2), (9,9)), 1, poly)
+    0.0
+    """
+    if circle_to_poly((line[0], radius), poly):
+        return 0.0
+    (ax,ay),(bx,by) = line
+    dx, dy = bx-ax, by-ay
+    first = None
+    for i,point in enumerate(poly):
+        t = sweep_circle_to_circle(line, radius, (point, 0))
+        if t is not None and (first is None or t < first):
+            first = t
+        (px,py),(qx,qy) = poly[i-1], point
+        ex, ey = qx-px, qy-py
+        length = math.sqrt(ex*ex + ey*ey)
+        denom = float(dx*ey - dy*ex)
+        if length == 0 or denom == 0:
+            continue
+        nx, ny = -ey*radius/length, ex*radius/length
+        for sx, sy in (px+nx, py+ny), (px-nx, py-ny):
+            t = ((sx-ax)*ey - (sy-ay)*ex)/denom
+            u = ((sx-ax)*dy - (sy-ay)*dx)/denom
+            if 0 <= t <= 1 and 0 <= u <= 1 and (first is None or t < first):
+                first = t
+    return first
+
+
+def sweep_circle_leave_rect(line, radius, rect):
+    """Find when a circle moving along line first sticks out of a rectangle.
+
+    @return: The first t in [0, 1] at which part of the circle is outside
+    rect, or None if it stays inside.
+
+    >>> rect = (-10,-10,20,20)
+    >>> sweep_circle_leave_rect(((0,0), (20,0)), 1, rect)
+    0.45
+    >>> sweep_circle_leave_rect(((0,0), (5,5)), 1, rect) is None
+    True
+    """
+    (x, y, w, h) = rect
+    first = None
+    for a, b, lo, hi in ((line[0][0], line[1][0], x, x+w),
+                         (line[0][1], line[1][1], y, y+h)):
+        lo += radius
+        hi -= radius
+        if a < lo or a > hi:
+            return 0.0
+        if b < lo:
+            t = (a-lo)/float(a-b)
+        elif b > hi:
+            t = (hi-a)/float(b-a)
+        else:
+            continue
+        if first is None or t < first:
+            first = t
+    return first
+
+
+class Geometry(object):
+    """A polygon compiled once for repeated collision tests.
+
+    Holds the polygon's bounding box, a bounding circle, its edges (in the
+    order line_cross_poly and circle_to_poly walk them), their outward
+    unit normals and the polygon's extent along each normal.  The methods
+    reject with the box or circle first, and use plain comparisons when the
+    polygon is an axis-aligned rectangle and separating-axis tests when it
+    is convex; they give the same answers as the functions above.
+
+    >>> g = Geometry(((0,0), (0,2), (4,2), (4,0)))
+    >>> g.aligned, g.box, g.radius
+    (True, (0, 0, 4, 2), 2.23606797749979)
+    >>> g.normals
+    ((0.0, -1.0), (-1.0, 0.0), (0.0, 1.0), (1.0, 0.0))
+    >>> g.contains((4,1)), g.contains((0,1))
+    (True, False)
+    >>> g.hits_circle((5,3), 1.5), g.crosses_line(((-1,3), (5,1)))
+    (True, True)
+    >>> g = Geometry(((0,-3), (3,0), (0,3), (-3,0)))
+    >>> g.aligned, g.convex
+    (False, True)
+    >>> g.hits_circle((2,2), .8), g.hits_circle((2,2), .6)
+    (True, False)
+    >>> g.crosses_line(((1,3), (3,-1))), g.crosses_line(((2,3), (3,2)))
+    (True, False)
+    """
+
+    # Margin by which the separating-axis test of a segment must decide;
+    # closer calls are left to line_cross_poly.
+    eps = 1e-6
+
+    def __init__(self, poly):
+        self.poly = tuple(tuple(p) for p in poly)
+        xs = [p[0] for p in self.poly]
+        ys = [p[1] for p in self.poly]
+        self.box = (min(xs), min(ys), max(xs), max(ys))
+        x1, y1, x2, y2 = self.box
+        self.center = ((x1 + x2) / 2.0, (y1 + y2) / 2.0)
+        self.radius = max(get_dist(self.center, p) for p in self.poly)
+        self.edges = tuple((p, self.poly[i-1])
+                           for i, p in enumerate(self.poly))
+        area = 0
+        for (ax, ay), (bx, by) in self.edges:
+            area += ax*by - bx*ay
+        # A positive sum means the edges run counter-clockwise, with the
+        # outside on their right.
+        orient = 1 if area > 0 else -1
+        normals = []
+        for (ax, ay), (bx, by) in self.edges:
+            length = math.hypot(bx - ax, by - ay) or 1
+            normals.append((orient * (by - ay) / length,
+                            -orient * (bx - ax) / length))
+        self.normals = tuple(normals)
+        self.extents = tuple((min(nx*x + ny*y for x, y in self.poly),
+                              max(nx*x + ny*y for x, y in self.poly))
+                             for nx, ny in self.normals)
+        self.lengths2 = tuple(float((bx - ax)**2 + (by - ay)**2)
+                              for (ax, ay), (bx, by) in self.edges)
+        turns = [(bx - ax)*(cy - by) - (by - ay)*(cx - bx)
+                 for ((bx, by), (ax, ay)), ((cx, cy), _) in
+                 zip(self.edges, self.edges[1:] + self.edges[:1])]
+        self.convex = (len(self.poly) >= 3 and
+                       (all(t >= 0 for t in turns) or
+                        all(t <= 0 for t in turns)))
+        self.aligned = (len(self.poly) == 4 and
+                        set(xs) == set((x1, x2)) and
+                        set(ys) == set((y1, y2)) and
+                        x1 < x2 and y1 < y2 and
+                        all(ax == bx or ay == by
+                            for (ax, ay), (bx, by) in self.edges))
+
+    def contains(self, point):
+        """Check if point falls in the polygon (see point_in_poly)."""
+        x, y = point
+        x1, y1, x2, y2 = self.box
+        if x < x1 or x > x2 or y < y1 or y > y2:
+            return False
+        if self.aligned:
+            return x1 < x and y1 < y
+        return point_in_poly(point, self.poly)
+
+    def hits_circle(self, center, radius):
+        """Check if a circle overlaps or falls in the polygon (see
+        circle_to_poly)."""
+        x, y = center
+        x1, y1, x2, y2 = self.box
+        if x < x1 - radius or x > x2 + radius or \
+           y < y1 - radius or y > y2 + radius:
+            return False
+        if self.aligned:
+            return math.hypot(max(x1 - x, 0, x - x2),
+                              max(y1 - y, 0, y - y2)) <= radius
+        reach = self.radius + radius
+        if (x - self.center[0])**2 + (y - self.center[1])**2 > reach * reach:
+            return False
+        if self.convex:
+            return self._separate_circle(x, y, radius)
+        return circle_to_poly((center, radius), self.poly)
+
+    def _separate_circle(self, x, y, radius):
+        """Separating-axis test of a circle against the convex polygon.
+
+        An edge normal along which the center lies farther out than the
+        radius separates them.  Otherwise the circle hits if the center is
+        inside every edge, or near enough one of the edges it is outside.
+        """
+        outside = False
+        for ((ax, ay), (bx, by)), (nx, ny), (lo, hi), length2 in zip(
+                self.edges, self.normals, self.extents, self.lengths2):
+            dist = nx*x + ny*y - hi
+            if dist > radius:
+                return False
+            if dist > 0:
+                outside = True
+                ex, ey = bx - ax, by - ay
+                t = ((x - ax)*ex + (y - ay)*ey) / length2
+                t = min(max(t, 0), 1)
+                dx, dy = x - ax - t*ex, y - ay - t*ey
+                if dx*dx + dy*dy <= radius*radius:
+                    return True
+        return not outside
+
+    def crosses_line(self, line):
+        """Check if a line segment crosses or falls in the polygon (see
+        line_cross_poly)."""
+        (ax, ay), (bx, by) = line
+        x1, y1, x2, y2 = self.box
+        if max(ax, bx) < x1 or min(ax, bx) > x2 or \
+           max(ay, by) < y1 or min(ay, by) > y2:
+            return False
+        if self.convex and not self.aligned:
+            crosses = self._separate_line(ax, ay, bx, by)
+            if crosses is not None:
+                return crosses
+        if self.contains(line[0]) or self.contains(line[1]):
+            return True
+        for edge in self.edges:
+            if line_cross_line(edge, line):
+                return True
+        return False
+
+    def _separate_line(self, ax, ay, bx, by):
+        """Separating-axis test of a segment against the convex polygon.
+
+        Tries the edge normals and the segment's own normal.  Returns False
+        if one separates them by more than eps, True if they overlap by
+        more than eps along all of them, and None otherwise.
+        """
+        eps = self.eps
+        overlap = True
+        for (nx, ny), (lo, hi) in zip(self.normals, self.extents):
+            pa = nx*ax + ny*ay
+            pb = nx*bx + ny*by
+            smin, smax = min(pa, pb), max(pa, pb)
+            if smin > hi + eps or smax < lo - eps:
+                return False
+            if smin > hi - eps or smax < lo + eps:
+                overlap = False
+        length = math.hypot(bx - ax, by - ay)
+        if not length:
+            return None
+        nx, ny = (ay - by) / length, (bx - ax) / length
+        offset = nx*ax + ny*ay
+        sides = [nx*x + ny*y - offset for x, y in self.poly]
+        if min(sides) > eps or max(sides) < -eps:
+            return False
+        if overlap and min(sides) < -eps and max(sides) > eps:
+            return True
+        return None
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError('batch collision tests require the numpy package')
+
+
+def _points(points):
+    """Return points as a float array of shape (N, 2)."""
+    _require_numpy()
+    return numpy.asarray(points, dtype=float).reshape(-1, 2)
+
+
+def _edges(poly):
+    """Return the start and end points of each edge of poly, as arrays."""
+    start = numpy.asarray(poly, dtype=float)
+    return start, numpy.roll(start, -1, axis=0)
+
+
+def points_in_poly(points, poly):
+    """Check which points fall in the given polygon (see point_in_poly).
+
+    @return: boolean array, one entry per point.
+
+    >>> list(points_in_poly([(.5,1), (5,2), (2,2)],
+    ...                     ((0,0), (4,2), (4,8), (0,7), (2,6), (0,5))))
+    [True, False, True]
+    """
+    points = _points(points)
+    x, y = points[:, 0], points[:, 1]
+    inside = numpy.zeros(len(points), dtype=bool)
+    for (p1x, p1y), (p2x, p2y) in zip(*_edges(poly)):
+        if p1y == p2y:
+            continue
+        cross = ((y > min(p1y, p2y)) & (y <= max(p1y, p2y)) &
+                 (x <= max(p1x, p2x)))
+        if p1x != p2x:
+            cross &= x <= p1x + (y-p1y)*(p2x-p1x)/(p2y-p1y)
+        inside ^= cross
+    return inside
+
+
+def dists_to_line(points, line):
+    """Calculate the distance from each point to a line segment.
+
+    @return: array of distances (see dist_to_line).
+
+    >>> list(dists_to_line([(3,2), (1,4)], ((1,1), (1,3))))
+    [2.0, 1.0]
+    """
+    points = _points(points)
+    (ax, ay), (bx, by) = line
+    cx, cy = points[:, 0], points[:, 1]
+    r = ((cx-ax)*(bx-ax) + (cy-ay)*(by-ay))/get_dist(line[0], line[1])**2
+    to_p = numpy.hypot(cx - (ax + r*(bx-ax)), cy - (ay + r*(by-ay)))
+    to_end = numpy.minimum(numpy.hypot(cx-ax, cy-ay), numpy.hypot(cx-bx, cy-by))
+    return numpy.where((r >= 0) & (r <= 1), to_p, to_end)
+
+
+def circles_to_poly(centers, radii, poly):
+    """Check which circles overlap or fall in the polygon (see
+    circle_to_poly).
+
+    @return: boolean array, one entry per circle.
+
+    >>> poly = ((0,0), (4,2), (4,8), (0,7), (2,6), (0, 5))
+    >>> list(circles_to_poly([(3,3), (5,2), (5,2)], [.5, 1.1, .9], poly))
+    [True, True, False]
+    """
+    centers = _points(centers)
+    radii = numpy.asarray(radii, dtype=float)
+    hit = points_in_poly(centers, poly)
+    for start, end in zip(*_edges(poly)):
+        hit |= dists_to_line(centers, (start, end)) <= radii
+    return hit
+
+
+def circles_to_circles(centers1, radii1, centers2, radii2):
+    """Check every circle of one set against every circle of another (see
+    circle_to_circle).
+
+    @return: boolean array of shape (N, M).
+
+    >>> circles_to_circles([(0,0)], 1, [(2,0), (2.1,0)], 1).tolist()
+    [[True, False]]
+    """
+    centers1 = _points(centers1)
+    centers2 = _points(centers2)
+    dist = numpy.hypot(centers1[:, 0, None] - centers2[None, :, 0],
+                       centers1[:, 1, None] - centers2[None, :, 1])
+    reach = (numpy.asarray(radii1, dtype=float).reshape(-1, 1) +
+             numpy.asarray(radii2, dtype=float).reshape(1, -1))
+    return dist <= reach
+
+
+def _clock(p1x, p1y, p2x, p2y, p3x, p3y):
+    """True where p1, p2, p3 are in clockwise order (see line_cross_line)."""
+    return (p3y-p1y)*(p2x-p1x) < (p2y-p1y)*(p3x-p1x)
+
+
+def segments_cross_polys(segments, polys):
+    """Check every segment against every polygon (see line_cross_poly).
+
+    @return: boolean array of shape (N, P).
+
+    >>> poly = ((0,0), (4,2), (4,8), (0,7), (2,6), (0, 5))
+    >>> segments_cross_polys([((1,1), (2,2)), ((5,2), (5,8))], [poly]).tolist()
+    [[True], [False]]
+    """
+    _require_numpy()
+    segments = numpy.asarray(segments, dtype=float).reshape(-1, 2, 2)
+    ax, ay = segments[:, 0, 0], segments[:, 0, 1]
+    bx, by = segments[:, 1, 0], segments[:, 1, 1]
+    result = numpy.zeros((len(segments), len(polys)), dtype=bool)
+    for j, poly in enumerate(polys):
+        hit = (points_in_poly(segments[:, 0], poly) |
+               points_in_poly(segments[:, 1], poly))
+        for (cx, cy), (dx, dy) in zip(*_edges(poly)):
+            hit |= ((_clock(ax, ay, cx, cy, dx, dy) !=
+                     _clock(bx, by, cx, cy, dx, dy)) &
+                    (_clock(ax, ay, bx, by, cx, cy) !=
+                     _clock(ax, ay, bx, by, dx, dy)))
+        result[:, j] = hit
+    return result
+
+
 if __name__=='__main__':
     import doctest
     doctest.testmod()
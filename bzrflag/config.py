@@ -32,6 +32,7 @@ import optparse
 import ConfigParser
 import logging
 
+import constants
 import world
 
 class ParseError(Exception): pass
@@ -84,6 +85,10 @@ class Config:
             action='store_true',
             dest='test',
             help='run in test mode (no GUI)')
+        p.add_option('--headless',
+            action='store_true', default=False,
+            dest='headless',
+            help='run without a GUI, but still report ports and results')
         p.add_option('--debug-out',
             dest='debug_out',
             help='output filename for debug messages')
@@ -119,6 +124,49 @@ class Config:
                                      of the occupancy grid)')
         p.add_option('--occgrid-width', type='int',
             default=50, help='width of reported occupancy grid')
+        p.add_option('--timestep',
+            type='float',
+            dest='timestep',
+            help='fixed simulation timestep in seconds (for --max-speed)')
+        p.add_option('--max-speed',
+            action='store_true', default=False,
+            dest='max_speed',
+            help='advance the game by a fixed timestep as fast as possible')
+        p.add_option('--tick-rate',
+            type='float', default=constants.TICKRATE,
+            dest='tick_rate',
+            help='in real time, main loop iterations per second (default\
+                                     %d)' % constants.TICKRATE)
+        p.add_option('--stats-interval',
+            type='float', default=0,
+            dest='stats_interval',
+            help='log the timings of each phase of a tick every this many\
+                                     seconds (they are also logged on SIGUSR1\
+                                     and at the end of the game)')
+        p.add_option('--max-substeps',
+            type='int', default=5,
+            dest='max_substeps',
+            help='in real time, the most timesteps simulated per loop when\
+                                     the game falls behind (default 5)')
+        p.add_option('--engine',
+            type='choice', choices=['python', 'numpy'],
+            dest='engine', default='python',
+            help='simulation engine: python (default) or numpy')
+        p.add_option('--obstacle-cell',
+            type='float',
+            dest='obstacle_cell',
+            help='cell size of the raster used for obstacle point and\
+                                     spawn queries')
+        p.add_option('--lockstep',
+            type='int',
+            dest='lockstep',
+            help='advance the game this many ticks each time every connected\
+                                     team has sent "step"')
+        p.add_option('--step-deadline',
+            type='float',
+            dest='step_deadline',
+            help='with --lockstep, seconds to wait for slow teams before\
+                                     stepping anyway')
 
         ## tank behavior
         p.add_option('--max-shots',
@@ -243,8 +291,30 @@ class Config:
                     value = config[key]
                     if type == 'int':
                         value = int(value)
+                    elif type == 'float':
+                        value = float(value)
                     setattr(opts,key,value)
 
+        if opts.timestep is not None and opts.timestep <= 0:
+            raise ArgumentError('timestep must be positive: %s'
+                                % opts.timestep)
+
+        if opts.obstacle_cell is not None and opts.obstacle_cell <= 0:
+            raise ArgumentError('obstacle cell size must be positive: %s'
+                                % opts.obstacle_cell)
+
+        if opts.tick_rate <= 0:
+            raise ArgumentError('tick rate must be positive: %s'
+                                % opts.tick_rate)
+
+        if opts.max_substeps < 1:
+            raise ArgumentError('max substeps must be at least one: %s'
+                                % opts.max_substeps)
+
+        if opts.lockstep is not None and opts.lockstep < 1:
+            raise ArgumentError('lockstep must be at least one tick: %s'
+                                % opts.lockstep)
+
         #if args:
             #p.parse_error('No positional arguments are allowed.')
         return vars(opts)
@@ -83,14 +83,24 @@ TANKSCALE = 1.2
 
 FONTSIZE = 16
 
-# A higher loop timeout decreases CPU usage but also decreases the frame rate.
-LOOP_TIMEOUT = 0.01
+# Default iterations per second of the main loop in real time (--tick-rate).
+# A lower rate decreases CPU usage but also decreases the frame rate.
+TICKRATE = 100
+
+# Simulated seconds per tick when the game runs on a fixed timestep.
+TIMESTEP = 0.02
 
 # Server
 BACKLOG = 5
 
 # Game
 RESPAWNTRIES = 1000
+# Spacing of the grid of precomputed spawn points around each base.
+SPAWNCELL = TANKRADIUS / 2.0
+# Cell size of the rasters that look up the nearest base.
+BASECELL = 20
+# Default cell size of the raster of obstacles (--obstacle-cell).
+OBSTACLECELL = 4
 
 
 
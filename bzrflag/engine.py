@@ -0,0 +1,530 @@
+# Bzrflag
+# Copyright 2008-2011 Brigham Young University
+#
+# This file is part of Bzrflag.
+#
+# Bzrflag is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Bzrflag is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bzrflag.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Inquiries regarding any further use of Bzrflag, please contact the Copyright
+# Licensing Office, Brigham Young University, 3760 HBLL, Provo, UT 84602,
+# (801) 422-9339 or 422-3821, e-mail copyright@byu.edu.
+
+"""NumPy simulation engine (--engine=numpy).
+
+Keeps the state of every tank and shot in the game in contiguous arrays so
+that they can be advanced for all objects at once.  The objects in
+:mod:`game` become thin views onto these arrays.
+
+"""
+__author__ = "BYU AML Lab <kseppi@byu.edu>"
+__copyright__ = "Copyright 2008-2011 Brigham Young University"
+__license__ = "GNU GPL"
+
+import math
+import logging
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import collisiontest
+import constants
+
+logger = logging.getLogger('engine')
+
+# What ObstacleMask.test says about a circle.
+CLEAR, BLOCKED, UNKNOWN = 0, 1, -1
+
+
+def require_numpy():
+    """Raise ImportError if NumPy is not installed."""
+    if numpy is None:
+        raise ImportError('--engine=numpy requires the numpy package')
+
+
+class TankArrays(object):
+    """Structure-of-arrays storage for the tanks in a game.
+
+    Row i of each array belongs to the tank whose `index` is i.  The arrays
+    grow as tanks are added, so views must always go through this object
+    rather than hold on to an array.
+    """
+
+    fields = ('rot', 'speed', 'goal_speed', 'angvel', 'goal_angvel')
+
+    def __init__(self, capacity=64):
+        require_numpy()
+        self.count = 0
+        self.tanks = []
+        self.moves = None
+        self.pos = numpy.zeros((capacity, 2))
+        self.vel = numpy.zeros((capacity, 2))
+        self.alive = numpy.zeros(capacity, dtype=bool)
+        self.team = numpy.zeros(capacity, dtype=int)
+        for name in self.fields:
+            setattr(self, name, numpy.zeros(capacity))
+
+    def add(self, tank, team):
+        """Allocate a row for a new tank and return its index."""
+        if self.count == len(self.alive):
+            self._grow(2 * len(self.alive))
+        index = self.count
+        self.team[index] = constants.COLORNAME.index(team.color)
+        self.tanks.append(tank)
+        self.count += 1
+        return index
+
+    def _grow(self, capacity):
+        for name in ('pos', 'vel', 'alive', 'team') + self.fields:
+            old = getattr(self, name)
+            new = numpy.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def update(self, dt):
+        """Advance the velocities and rotation of every live tank by dt.
+
+        This is the vectorized equivalent of Tank.update_goals and
+        Tank.velocity.  Positions are left alone; see test_moves.
+        """
+        idx = numpy.flatnonzero(self.alive[:self.count])
+        speed = self.speed[idx]
+        step = constants.LINEARACCEL * dt
+        speed = numpy.clip(self.goal_speed[idx], speed - step, speed + step)
+        angvel = self.angvel[idx]
+        step = constants.ANGULARACCEL * dt
+        angvel = numpy.clip(self.goal_angvel[idx], angvel - step,
+                            angvel + step)
+        rot = self.rot[idx] + angvel * constants.TANKANGVEL * dt
+        rot %= 2 * math.pi
+
+        self.speed[idx] = speed
+        self.angvel[idx] = angvel
+        self.rot[idx] = rot
+        self.vel[idx, 0] = speed * numpy.cos(rot) * constants.TANKSPEED
+        self.vel[idx, 1] = speed * numpy.sin(rot) * constants.TANKSPEED
+
+    def test_moves(self, dt, mask):
+        """Test the moves of every live tank against the obstacles and walls.
+
+        Tank.move tries the full move for dt, then the move along y alone,
+        then along x alone.  Those positions are worked out at once for
+        all live tanks that are on the map, and classified by mask (an
+        ObstacleMask).  `moves`
+        then holds, by tank index, the pair ([position, ...], [kind, ...])
+        for ArrayTank.update, or None for a tank that was not tested.
+        """
+        n = self.count
+        idx = numpy.flatnonzero(self.alive[:n] &
+                                (self.pos[:n] != constants.DEADZONE).any(axis=1))
+        pos = self.pos[idx]
+        step = self.vel[idx] * dt
+        candidates = numpy.empty((len(idx), 3, 2))
+        candidates[:, 0] = pos + step
+        candidates[:, 1, 0] = pos[:, 0]
+        candidates[:, 1, 1] = pos[:, 1] + step[:, 1]
+        candidates[:, 2, 0] = pos[:, 0] + step[:, 0]
+        candidates[:, 2, 1] = pos[:, 1]
+        kinds = mask.test(candidates.reshape(-1, 2)).reshape(-1, 3)
+        self.moves = [None] * n
+        for i, positions, kind in zip(idx.tolist(), candidates.tolist(),
+                                      kinds.tolist()):
+            self.moves[i] = (positions, kind)
+
+
+class ObstacleMask(object):
+    """Obstacle and wall test for many circles of one radius at once.
+
+    Built from the game's ObstacleRaster.  A cell is CLEAR if no obstacle
+    comes within `radius` of any point in it and BLOCKED if it lies inside
+    an obstacle.  Circles in the other cells are measured against the
+    edges of the convex obstacles that can reach them, and only those
+    within `margin` of touching one (or near an obstacle that is not
+    convex) are left UNKNOWN, for the exact test.  A circle that crosses a
+    wall is BLOCKED, as in Tank.collision_at, and one whose centre is off
+    the raster is UNKNOWN.
+    """
+
+    margin = 1e-6
+
+    def __init__(self, raster, size, radius):
+        require_numpy()
+        self.radius = radius
+        self.cell_size = raster.cell_size
+        self.origin = numpy.array(raster.origin)
+        cols, rows = raster.cols, raster.rows
+        empty = numpy.array([[cell is None for cell in column]
+                             for column in raster.cells], dtype=bool)
+        full = numpy.array([[cell is True for cell in column]
+                            for column in raster.cells], dtype=bool)
+        # A cell is clear if every cell within radius of it is empty; cells
+        # off the raster count as not empty.
+        reach = int(math.ceil(radius / self.cell_size)) + 1
+        padded = numpy.zeros((cols + 2*reach, rows + 2*reach), dtype=bool)
+        padded[reach:reach+cols, reach:reach+rows] = empty
+        clear = numpy.ones((cols, rows), dtype=bool)
+        for di in xrange(-reach, reach + 1):
+            for dj in xrange(-reach, reach + 1):
+                gap = self.cell_size * math.hypot(max(abs(di) - 1, 0),
+                                                  max(abs(dj) - 1, 0))
+                if gap <= radius + 1e-6:
+                    clear &= padded[reach+di:reach+di+cols,
+                                    reach+dj:reach+dj+rows]
+        self.kinds = numpy.empty((cols, rows), dtype=numpy.int8)
+        self.kinds.fill(UNKNOWN)
+        self.kinds[clear] = CLEAR
+        self.kinds[full] = BLOCKED
+        # The same bounds as the wall test of Tank.collision_at.
+        self.walls = (-size[0]/2, -size[1]/2, size[0]/2, size[1]/2)
+
+        # Edges and outward normals of every obstacle, padded to the same
+        # count by repeating the last edge, and for each cell the obstacles
+        # that come within radius of it, as ranges of `near`.
+        geometries = [o.geometry for o in raster.tree.obstacles]
+        count = max([len(g.edges) for g in geometries] or [1])
+        cells = [[] for i in xrange(cols * rows)]
+        self.starts = numpy.zeros((len(geometries), count, 2))
+        self.ends = numpy.zeros((len(geometries), count, 2))
+        self.normals = numpy.zeros((len(geometries), count, 2))
+        self.convex = numpy.zeros(len(geometries), dtype=bool)
+        for k, geometry in enumerate(geometries):
+            x1, y1, x2, y2 = geometry.box
+            i1, j1 = raster.cell((x1 - radius, y1 - radius))
+            i2, j2 = raster.cell((x2 + radius, y2 + radius))
+            for i in xrange(max(i1, 0), min(i2, cols - 1) + 1):
+                for j in xrange(max(j1, 0), min(j2, rows - 1) + 1):
+                    if self.kinds[i, j] == UNKNOWN:
+                        cells[i * rows + j].append(k)
+            edges = list(geometry.edges)
+            normals = list(geometry.normals)
+            edges += edges[-1:] * (count - len(edges))
+            normals += normals[-1:] * (count - len(normals))
+            self.starts[k] = [a for a, b in edges]
+            self.ends[k] = [b for a, b in edges]
+            self.normals[k] = normals
+            self.convex[k] = geometry.convex
+        self.counts = numpy.array([len(near) for near in cells], dtype=int)
+        self.firsts = numpy.cumsum(self.counts) - self.counts
+        self.near = numpy.array([k for near in cells for k in near],
+                                dtype=int)
+
+    def test(self, points):
+        """Return CLEAR, BLOCKED or UNKNOWN for a circle at each point."""
+        rad = self.radius
+        left, bottom, right, top = self.walls
+        x, y = points[:, 0], points[:, 1]
+        wall = ((x - rad < left) | (y - rad < bottom) |
+                (x + rad > right) | (y + rad > top))
+        cells = numpy.floor((points - self.origin) / self.cell_size)
+        i = cells[:, 0].astype(int)
+        j = cells[:, 1].astype(int)
+        cols, rows = self.kinds.shape
+        on = (i >= 0) & (i < cols) & (j >= 0) & (j < rows)
+        kinds = numpy.empty(len(points), dtype=numpy.int8)
+        kinds.fill(UNKNOWN)
+        kinds[on] = self.kinds[i[on], j[on]]
+        kinds[wall] = BLOCKED
+        near = numpy.flatnonzero((kinds == UNKNOWN) & on)
+        if len(near):
+            kinds[near] = self._measure(points[near],
+                                        i[near] * rows + j[near])
+        return kinds
+
+    def _measure(self, points, cells):
+        """Classify circles at points, in the given cells, by their distance
+        to the obstacles near those cells."""
+        rad = self.radius
+        counts = self.counts[cells]
+        which = numpy.repeat(numpy.arange(len(points)), counts)
+        offsets = numpy.arange(len(which)) - numpy.repeat(
+                numpy.cumsum(counts) - counts, counts)
+        obs = self.near[numpy.repeat(self.firsts[cells], counts) + offsets]
+        p = points[which][:, None, :]
+        a = self.starts[obs]
+        ab = self.ends[obs] - a
+        ap = p - a
+        inside = ((ap * self.normals[obs]).sum(axis=2) <= 0).all(axis=1)
+        length2 = (ab ** 2).sum(axis=2)
+        length2[length2 == 0] = 1
+        t = numpy.clip((ap * ab).sum(axis=2) / length2, 0, 1)
+        gap = ap - t[:, :, None] * ab
+        dist = numpy.sqrt((gap ** 2).sum(axis=2)).min(axis=1)
+        dist[inside] = 0
+        hit = dist < rad - self.margin
+        close = ~hit & ((dist <= rad + self.margin) | ~self.convex[obs])
+        kinds = numpy.zeros(len(points), dtype=numpy.int8)
+        kinds.fill(CLEAR)
+        kinds[which[close]] = UNKNOWN
+        kinds[which[hit & self.convex[obs]]] = BLOCKED
+        return kinds
+
+
+class ShotPool(object):
+    """Structure-of-arrays storage for every shot in flight.
+
+    Live shots occupy slots 0 to count-1.  Each slot holds the shot's
+    position, velocity, speed, distance travelled and the index of the tank
+    (in TankArrays) that fired it; `shots` holds the game.PoolShot view for
+    each slot.  Removing a shot moves the last shot into its slot, so a
+    view's `slot` may change while the shot is alive.
+    `owner_count` maps a tank index to its number of live shots.
+    """
+
+    fields = ('speed', 'distance')
+
+    def __init__(self, tank_arrays, obstacles, config, capacity=64):
+        require_numpy()
+        self.tank_arrays = tank_arrays
+        self.obstacles = obstacles
+        self.config = config
+        self.count = 0
+        self.shots = []
+        self.owner_count = {}
+        self.updating = False
+        self.pos = numpy.zeros((capacity, 2))
+        self.vel = numpy.zeros((capacity, 2))
+        self.owner = numpy.zeros(capacity, dtype=int)
+        self.alive = numpy.zeros(capacity, dtype=bool)
+        for name in self.fields:
+            setattr(self, name, numpy.zeros(capacity))
+
+        # Bounding boxes of the obstacles, for a vectorized first pass.
+        self.obs_min = numpy.zeros((len(obstacles), 2))
+        self.obs_max = numpy.zeros((len(obstacles), 2))
+        for i, obstacle in enumerate(obstacles):
+            shape = numpy.array(obstacle.shape, dtype=float)
+            self.obs_min[i] = shape.min(axis=0)
+            self.obs_max[i] = shape.max(axis=0)
+
+    def add(self, shot, pos, vel, owner):
+        """Store a new shot and return its slot."""
+        if self.count == len(self.alive):
+            self._grow(2 * len(self.alive))
+        slot = self.count
+        self.pos[slot] = pos
+        self.vel[slot] = vel
+        self.speed[slot] = math.hypot(*vel)
+        self.distance[slot] = 0
+        self.owner[slot] = owner
+        self.alive[slot] = True
+        self.shots.append(shot)
+        self.owner_count[owner] = self.owner_count.get(owner, 0) + 1
+        self.count += 1
+        return slot
+
+    def _grow(self, capacity):
+        for name in ('pos', 'vel', 'owner', 'alive') + self.fields:
+            old = getattr(self, name)
+            new = numpy.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def owned_by(self, owner):
+        """Return the live shots fired by the tank with the given index."""
+        n = self.count
+        slots = numpy.flatnonzero((self.owner[:n] == owner) & self.alive[:n])
+        return [self.shots[slot] for slot in slots]
+
+    def kill(self, slot):
+        """Remove the shot in the given slot.
+
+        During update the slot is only marked dead; all dead slots are
+        removed together at the end of the update.
+        """
+        self.alive[slot] = False
+        if not self.updating:
+            self._cull()
+
+    def _cull(self):
+        """Remove all dead slots, filling each from the end of the pool."""
+        dead = numpy.flatnonzero(~self.alive[:self.count])
+        for slot in dead[::-1]:
+            last = self.count - 1
+            self.shots[slot].slot = None
+            self.owner_count[self.owner[slot]] -= 1
+            if slot != last:
+                for name in ('pos', 'vel', 'owner', 'alive') + self.fields:
+                    array = getattr(self, name)
+                    array[slot] = array[last]
+                self.shots[slot] = self.shots[last]
+                self.shots[slot].slot = slot
+            self.shots.pop()
+            self.count -= 1
+
+    def records(self):
+        """Return [x, y, vx, vy] for every shot in flight."""
+        n = self.count
+        return numpy.hstack((self.pos[:n], self.vel[:n])).tolist()
+
+    def boxes(self, dt):
+        """Return (shot, box) for each shot whose path may reach a tank.
+
+        The box bounds the path the shot takes in dt.  Shots that start
+        outside the walls are left out, as _sweep_walls stops them where
+        they are.
+        """
+        n = self.count
+        rad = constants.SHOTRADIUS
+        half = numpy.array(self.config.world.size, dtype=float) / 2 - rad
+        start = self.pos[:n]
+        end = start + self.vel[:n] * dt
+        lo = (numpy.minimum(start, end) - rad).tolist()
+        hi = (numpy.maximum(start, end) + rad).tolist()
+        inside = (abs(start) <= half).all(axis=1)
+        return [(self.shots[slot], tuple(lo[slot] + hi[slot]))
+                for slot in numpy.flatnonzero(inside)]
+
+    def update(self, dt, contacts):
+        """Move every shot and remove the ones that hit something.
+
+        Mirrors Shot.update and Shot.check_path: each shot is swept along
+        its path and stops at the first obstacle, tank or wall it touches,
+        and a shot that has flown further than SHOTRANGE expires.
+        `contacts` maps each shot to the tanks the broadphase paired it
+        with, from the boxes given by self.boxes; no other tank is tested.
+        """
+        n = self.count
+        if not n:
+            return
+        start = self.pos[:n].copy()
+        delta = self.vel[:n] * dt
+        self.pos[:n] += delta
+        self.distance[:n] += self.speed[:n] * dt
+        self.updating = True
+        try:
+            self._sweep(start, delta, contacts)
+            for slot in numpy.flatnonzero(self.distance[:n] >
+                                          constants.SHOTRANGE):
+                self.shots[slot].kill()
+        finally:
+            self.updating = False
+        self._cull()
+
+    def _sweep(self, start, delta, contacts):
+        """Stop each shot at the first thing its path touches."""
+        inf = float('inf')
+        t_obs = self._sweep_obstacles(start, delta)
+        t_wall = self._sweep_walls(start, delta)
+        # Tanks in the order each shot would reach them; one may already
+        # have been killed by an earlier shot.
+        reached = {}
+        for slot, i, t in zip(*self._sweep_tanks(start, delta, contacts)):
+            reached.setdefault(slot, []).append((t, i))
+        first = numpy.minimum(t_obs, t_wall)
+        tanks = self.tank_arrays
+        for slot in sorted(set(numpy.flatnonzero(first < inf).tolist()) |
+                           set(reached)):
+            if not self.alive[slot]:
+                continue
+            t_stop = min(t_obs[slot], t_wall[slot])
+            target = None
+            for t, i in reached.get(slot, ()):
+                if t >= t_stop:
+                    break
+                if tanks.alive[i]:
+                    t_stop = t
+                    target = tanks.tanks[i]
+                    break
+            if t_stop == inf:
+                continue
+            self.pos[slot] = start[slot] + t_stop * delta[slot]
+            if target is not None:
+                target.kill()
+            self.shots[slot].kill()
+
+    def _sweep_obstacles(self, start, delta):
+        n = self.count
+        t_first = numpy.empty(n)
+        t_first.fill(float('inf'))
+        if not len(self.obstacles):
+            return t_first
+        rad = constants.SHOTRADIUS
+        end = start + delta
+        lo = numpy.minimum(start, end) - rad
+        hi = numpy.maximum(start, end) + rad
+        near = ((lo[:, None, 0] <= self.obs_max[None, :, 0]) &
+                (hi[:, None, 0] >= self.obs_min[None, :, 0]) &
+                (lo[:, None, 1] <= self.obs_max[None, :, 1]) &
+                (hi[:, None, 1] >= self.obs_min[None, :, 1]))
+        for slot, i in zip(*numpy.nonzero(near)):
+            line = (tuple(start[slot]), tuple(end[slot]))
+            t = collisiontest.sweep_circle_to_poly(line, rad,
+                                                   self.obstacles[i].shape)
+            if t is not None and t < t_first[slot]:
+                t_first[slot] = t
+        return t_first
+
+    def _sweep_tanks(self, start, delta, contacts):
+        """Return the first contacts between shots and the tanks paired
+        with them in `contacts`.
+
+        The result is three lists, of shot slots, tank indices and contact
+        times, sorted by slot, then time, then tank index.
+        """
+        slots = []
+        indices = []
+        for slot, shot in enumerate(self.shots):
+            for tank in contacts.get(shot, ()):
+                slots.append(slot)
+                indices.append(tank.index)
+        if not slots:
+            return [], [], []
+        slots = numpy.array(slots, dtype=int)
+        indices = numpy.array(indices, dtype=int)
+        tanks = self.tank_arrays
+        rad = constants.TANKRADIUS + constants.SHOTRADIUS
+        d = delta[slots]
+        f = start[slots] - tanks.pos[indices]
+        a = (d ** 2).sum(axis=1)
+        b = (f * d).sum(axis=1)
+        c = (f ** 2).sum(axis=1) - rad ** 2
+        disc = b ** 2 - a * c
+        inside = c <= 0
+        moving = (~inside) & (a > 0) & (b < 0) & (disc >= 0)
+        t = numpy.empty(len(slots))
+        t.fill(float('inf'))
+        t[inside] = 0.0
+        root = numpy.sqrt(numpy.where(moving, disc, 0))
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            t_moving = (-b - root) / a
+        moving &= t_moving <= 1
+        t[moving] = t_moving[moving]
+
+        owner = self.owner[slots]
+        keep = ((t < float('inf')) & tanks.alive[indices] &
+                self.alive[slots] & (owner != indices))
+        if not self.config['friendly_fire']:
+            keep &= tanks.team[owner] != tanks.team[indices]
+        slots, indices, t = slots[keep], indices[keep], t[keep]
+        order = numpy.lexsort((indices, t, slots))
+        return (slots[order].tolist(), indices[order].tolist(),
+                t[order].tolist())
+
+    def _sweep_walls(self, start, delta):
+        n = self.count
+        rad = constants.SHOTRADIUS
+        half = numpy.array(self.config.world.size, dtype=float) / 2 - rad
+        end = start + delta
+        t = numpy.empty((n, 2))
+        t.fill(float('inf'))
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            t_hi = (half - start) / delta
+            t_lo = (-half - start) / delta
+        t = numpy.where(end > half, t_hi, t)
+        t = numpy.where(end < -half, t_lo, t)
+        t[(start > half) | (start < -half)] = 0.0
+        return t.min(axis=1)
+
+# vim: et sw=4 sts=4
@@ -0,0 +1,116 @@
+# Bzrflag
+# Copyright 2008-2011 Brigham Young University
+#
+# This file is part of Bzrflag.
+#
+# Bzrflag is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Bzrflag is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bzrflag.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Inquiries regarding any further use of Bzrflag, please contact the Copyright
+# Licensing Office, Brigham Young University, 3760 HBLL, Provo, UT 84602,
+# (801) 422-9339 or 422-3821, e-mail copyright@byu.edu.
+
+"""Event bus for announcing game objects to the display and other observers.
+
+The game publishes an 'add' event when an object enters the world and a
+'remove' event when it leaves.  Nothing is kept for topics that nobody
+subscribes to, so a headless game does not accumulate events.
+
+"""
+__author__ = "BYU AML Lab <kseppi@byu.edu>"
+__copyright__ = "Copyright 2008-2011 Brigham Young University"
+__license__ = "GNU GPL"
+
+import logging
+
+logger = logging.getLogger('events')
+
+ADD = 'add'
+REMOVE = 'remove'
+
+
+class EventBus(object):
+    """Calls the subscribers of a topic, in order, for each event published.
+
+    >>> bus = EventBus()
+    >>> bus.publish(ADD, 'dropped')
+    >>> seen = []
+    >>> bus.subscribe(ADD, seen.append)
+    >>> bus.publish(ADD, 'tank')
+    >>> bus.publish(REMOVE, 'shot')
+    >>> seen
+    ['tank']
+    >>> bus.unsubscribe(ADD, seen.append)
+    >>> bus.publish(ADD, 'flag')
+    >>> seen
+    ['tank']
+    """
+
+    def __init__(self):
+        self.subscribers = {}
+
+    def subscribe(self, topic, callback):
+        self.subscribers.setdefault(topic, []).append(callback)
+
+    def unsubscribe(self, topic, callback):
+        callbacks = self.subscribers.get(topic, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if not callbacks:
+            self.subscribers.pop(topic, None)
+
+    def publish(self, topic, *args):
+        for callback in self.subscribers.get(topic, ()):
+            callback(*args)
+
+
+class Queue(object):
+    """Subscriber that keeps (topic, args) events until they are drained.
+
+    Used by consumers that can only act at certain times, such as the
+    display between frames.
+
+    >>> bus = EventBus()
+    >>> queue = Queue(bus, (ADD, REMOVE))
+    >>> bus.publish(ADD, 'shot')
+    >>> bus.publish(REMOVE, 'shot')
+    >>> queue.drain()
+    [('add', ('shot',)), ('remove', ('shot',))]
+    >>> queue.drain()
+    []
+    """
+
+    def __init__(self, bus, topics):
+        self.events = []
+        for topic in topics:
+            bus.subscribe(topic, self._callback(topic))
+
+    def _callback(self, topic):
+        def callback(*args):
+            self.events.append((topic, args))
+        return callback
+
+    def drain(self):
+        """Return the queued events, oldest first, and forget them."""
+        events, self.events = self.events, []
+        return events
+
+    def __len__(self):
+        return len(self.events)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+# vim: et sw=4 sts=4
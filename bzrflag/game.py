@@ -31,15 +31,22 @@ __license__ = "GNU GPL"
 
 import math
 import random
+import cPickle
 import datetime
+import time
 import logging
 import asyncore
 
 import collisiontest
 import constants
 import config
+import engine
+import events
 import graphics
 import server
+import spatial
+import stats
+import timers
 
 logger = logging.getLogger('game')
 
@@ -51,13 +58,25 @@ class GameLoop:
         self.config = config
         if self.config['random_seed'] != -1:
             random.seed(self.config['random_seed'])
+        self.headless = self.config['test'] or self.config['headless']
+        self.events = events.EventBus()
+        if not self.headless:
+            # The display only exists between frames, so queue its events.
+            self.sprite_events = events.Queue(self.events,
+                                              (events.ADD, events.REMOVE))
         self.game = Game(self, self.config)
-        if not self.config['test']:
+        if not self.headless:
             self.display = graphics.Display(self, self.config)
         self.running = False
         self.gameover = False
         self.timestamp = datetime.datetime.utcnow()
+        self.timestep = self.config.get('timestep', constants.TIMESTEP)
+        self.ticks = 0
+        # Real time not yet simulated, and real time given up on.
+        self.accumulator = 0.0
+        self.dropped_time = 0.0
         self.messages = []
+        self.servers = {}
 
     def start_servers(self):
         """Start servers for each team. """
@@ -65,28 +84,66 @@ class GameLoop:
             port = self.config[color + '_port']
             address = ('0.0.0.0', port)
             srv = server.Server(address, team, self.game, self.config)
+            self.servers[color] = srv
             if not self.config['test']:
                 print 'port for %s: %s' % (color, srv.get_port())
 
     def update_game(self):
-        """Updates the game world."""
+        """Updates the game world.
+
+        With --max-speed or --lockstep the game advances by a fixed timestep
+        on every call.  Otherwise the wall-clock time since the previous
+        call is added to an accumulator, and the game advances by as many
+        whole timesteps as it holds, up to --max-substeps.  Time beyond that
+        budget is dropped (and counted in dropped_time) rather than
+        simulated in one large step.
+        """
+        if self.config['max_speed'] or self.game.lockstep:
+            self.step_game(self.timestep)
+            return
         now = datetime.datetime.utcnow()
         delta = now - self.timestamp
         self.timestamp = now
-        dt = ((24 * 60 * 60) * delta.days
-               + delta.seconds
-               + (10 ** -6) * delta.microseconds)
+        self.accumulator += ((24 * 60 * 60) * delta.days
+                             + delta.seconds
+                             + (10 ** -6) * delta.microseconds)
+        steps = 0
+        while self.accumulator >= self.timestep and not self.game.end_game:
+            if steps == self.config['max_substeps']:
+                behind = self.accumulator - self.accumulator % self.timestep
+                self.dropped_time += behind
+                self.accumulator -= behind
+                break
+            self.step_game(self.timestep)
+            self.accumulator -= self.timestep
+            steps += 1
+
+    def step_game(self, dt):
+        """Advance the game by dt."""
         self.game.update(dt)
+        self.ticks += 1
+
+    def update_lockstep(self):
+        """Advance the game once every connected team has asked to step."""
+        lockstep = self.game.lockstep
+        if not lockstep.ready():
+            return
+        for i in xrange(lockstep.ticks):
+            if self.game.end_game:
+                break
+            self.update_game()
+        lockstep.release()
 
     def update_graphics(self):
         """Updates graphics based on recent changes to game state.
 
         Adds and removes sprites from the display, etc.
         """
-        while len(self.game.inbox) > 0:
-            self.display.add_object(self.game.inbox.pop())
-        while len(self.game.trash) > 0:
-            self.display.remove_object(self.game.trash.pop())
+        for topic, (obj,) in self.sprite_events.drain():
+            if topic == events.ADD:
+                self.display.add_object(obj)
+            else:
+                self.display.remove_object(obj)
 
         # Write any pending messages to the console.
         for message in self.messages:
@@ -100,83 +157,344 @@ class GameLoop:
         the pygame window is closed, KeyboardInterrupt, or System Exit.
         """
         self.running = True
-        self.start_servers()
-        if not self.config['test']:
+        if not self.servers:
+            self.start_servers()
+        if not self.headless:
             self.display.setup()
+        if self.config['max_speed'] or self.game.lockstep:
+            # The game is not paced by the clock; see service_sockets.
+            governor = None
+        else:
+            governor = timers.Governor(self.config['tick_rate'])
+        interval = self.config['stats_interval']
+        if interval:
+            stats.show()
+        phases = self.game.phases
+        clock = time.time
+        started = clock()
+        next_log = started + interval
         try:
             while self.running:
                 if self.game.end_game:
                     break
-                asyncore.loop(constants.LOOP_TIMEOUT, count=1)
-                self.update_game()
-                if not self.config['test']:
+                t0 = clock()
+                self.service_sockets(governor)
+                t1 = clock()
+                if self.game.lockstep:
+                    self.update_lockstep()
+                else:
+                    self.update_game()
+                t2 = clock()
+                phases.record('sockets', t1 - t0)
+                phases.record('update', t2 - t1)
+                if not self.headless:
                     self.update_graphics()
+                    t3 = clock()
                     self.display.update()
+                    phases.record('graphics', t3 - t2)
+                    phases.record('display', clock() - t3)
+                if interval and t2 >= next_log:
+                    self.log_phases()
+                    next_log = t2 + interval
         except KeyboardInterrupt:
             pass
         finally:
+            self.log_phases()
             final_scores = '\nFinal Score\n'
             for team in self.game.teams:
                 team_total = self.game.teams[team].score.total()
                 final_scores += 'Team %s: %d\n' % (team, team_total)
+            elapsed = time.time() - started
+            rate = '%d ticks in %.2f seconds (%.1f ticks/second)' % (
+                    self.ticks, elapsed, self.ticks / max(elapsed, 1e-9))
+            if governor is not None:
+                rate += '; loop at %.1f Hz, jitter %.2f ms' % (
+                        governor.rate, 1000 * governor.jitter)
+            if self.dropped_time:
+                rate += ' (%.2f seconds dropped)' % self.dropped_time
+            logger.info(rate)
             if not self.config['test']:
                 print final_scores
+                print rate
+
+    def log_phases(self):
+        """Log the recent timings of each phase of a tick."""
+        self.game.phases.log()
+
+    def report_phases(self, *args):
+        """Log the phase timings, even if only warnings are being logged.
+
+        bzrflag.run installs this as the handler for SIGUSR1, so the
+        timings of a running game can be asked for with `kill -USR1`.
+        """
+        stats.show()
+        self.log_phases()
+
+    def service_sockets(self, governor):
+        """Service the sockets before the next update.
+
+        In real time the governor spends the rest of the tick period on
+        them.  With --max-speed they are only polled.  Under --lockstep the
+        game steps as soon as it is ready; until then the loop sleeps in
+        the sockets for at most a tick period, so a step deadline is still
+        noticed on time.
+        """
+        if governor is not None:
+            governor.wait(self.poll)
+        elif self.game.lockstep and not self.game.lockstep.ready():
+            self.poll(1.0 / self.config['tick_rate'])
+        else:
+            self.poll(0)
+
+    def poll(self, timeout):
+        """Service the sockets, waiting up to timeout seconds for one."""
+        asyncore.loop(timeout, count=1)
 
     def kill(self):
         self.running = False
-        if not self.config['test']:
+        if not self.headless:
             self.display.kill()
 
     def write_message(self, message):
-        self.messages.append(message)
+        if self.headless:
+            logger.info(message)
+        else:
+            self.messages.append(message)
+
+
+class DetachedLoop(object):
+    """Stands in for the GameLoop of a forked Game.
+
+    It is headless and has an event bus of its own, so nothing the fork
+    does reaches the original game's display.
+    """
+
+    headless = True
+
+    def __init__(self):
+        self.events = events.EventBus()
+
+    def write_message(self, message):
+        logger.info(message)
 
 
 class Game(object):
-    """Manages the game data."""
+    """Manages the game data.
 
-    def __init__(self, game_loop, config):
+    If `static` is another Game on the same world, its obstacle data is
+    shared instead of being rebuilt.
+
+    `phases` times the steps of update ('broadphase', 'shots', 'tanks',
+    'timers', which includes scoring, and 'respawns'); GameLoop adds the
+    phases of its own loop ('sockets', including any idle wait, 'update',
+    'graphics' and 'display').
+
+    During update, `contacts` holds the broadphase pairs found by sweep;
+    see contacts_of.
+    """
+
+    snapshot_version = 1
+
+    def __init__(self, game_loop, config, static=None):
         self.game_loop = game_loop
         self.config = config
         self.end_game = False
+        self.random = random.Random()
+        if self.config['random_seed'] != -1:
+            self.random.seed(self.config['random_seed'])
 
-        # queue of objects that need to be created or destroyed
-        self.inbox = []
-        self.trash = []
+        # announces objects that are created or destroyed
+        self.events = game_loop.events
         self.timespent = 0.0
         self.timelimit = self.config['time_limit']
         self.inertia_linear = 1
         self.inertia_angular = 1
-        self.taunt_timer = 0
+        self.timers = timers.Scheduler()
+        self.phases = stats.Phases()
         self.taunt_msg = None
         self.taunt_color = None
+        self.taunt_event = None
+        self.lockstep = None
+        if self.config['lockstep']:
+            self.lockstep = server.Lockstep(self.config['lockstep'],
+                                            self.config['step_deadline'])
+
+        self.tank_arrays = None
+        self.shot_pool = None
+        self.obstacle_mask = None
 
         # track objects on map
-        self.obstacles = [Box(i) for i in self.config.world.boxes]
-        self.build_truegrid()
+        if static is None:
+            self.obstacles = [Box(i) for i in self.config.world.boxes]
+            self.obstacle_tree = spatial.ObstacleTree(self.obstacles)
+            self.obstacle_grid = spatial.ObstacleGrid(self.obstacles,
+                                                      2 * constants.TANKRADIUS)
+            self.obstacle_raster = spatial.ObstacleRaster(
+                    self.obstacle_tree, self.config.world.size,
+                    self.config.get('obstacle_cell', constants.OBSTACLECELL))
+            self.build_truegrid()
+        else:
+            self.obstacles = static.obstacles
+            self.obstacle_tree = static.obstacle_tree
+            self.obstacle_grid = static.obstacle_grid
+            self.obstacle_raster = static.obstacle_raster
+            self.occgrid = static.occgrid
+        self.tank_hash = spatial.SpatialHash(2 * constants.TANKRADIUS)
+        self.broadphase = spatial.SweepAndPrune(
+                [('tank', 'tank'), ('shot', 'tank'), ('flag', 'tank')])
+        self.contacts = None
+        self.swept = {}
+        self.unswept = []
+        self.shot_registry = ShotRegistry()
+        if self.config['engine'] == 'numpy':
+            self.tank_arrays = engine.TankArrays()
+            self.shot_pool = engine.ShotPool(self.tank_arrays, self.obstacles,
+                                             self.config)
+            if static is not None and static.obstacle_mask is not None:
+                self.obstacle_mask = static.obstacle_mask
+            else:
+                self.obstacle_mask = engine.ObstacleMask(
+                        self.obstacle_raster, self.config.world.size,
+                        constants.TANKRADIUS)
         self.bases = dict((i.color, Base(i)) for i in self.config.world.bases)
+        self.base_grid = spatial.NearestGrid(
+                [(base, base.center) for base in self.bases.values()],
+                self.config.world.size, constants.BASECELL, 2)
 
         self.teams = {}
         for color,base in self.bases.items():
             self.teams[color] = Team(self, color, base, self.config)
 
     def update(self, dt):
-        """Update the teams."""
+        """Update the teams, then fire the timers that fall due."""
         self.timespent += dt
-        if self.taunt_msg is not None:
-            self.taunt_timer -= dt
-            if self.taunt_timer <= 0:
-                self.taunt_msg = None
-                self.game_loop.display.redraw()
         if self.timespent > self.config['time_limit']:
             self.end_game = True
             return
+        clock = time.time
+        t = clock()
+        self.sweep(dt)
+        t0 = clock()
+        try:
+            if self.tank_arrays is not None:
+                self.tank_arrays.update(dt)
+                self.shot_pool.update(dt, self.contacts)
+                self.tank_arrays.test_moves(dt, self.obstacle_mask)
+            else:
+                for shot in self.shots():
+                    shot.update(dt)
+            t1 = clock()
+            for team in self.teams.values():
+                team.update(dt)
+        finally:
+            self.contacts = None
+            if self.tank_arrays is not None:
+                self.tank_arrays.moves = None
+        t2 = clock()
+        self.timers.advance(dt)
+        t3 = clock()
         for team in self.teams.values():
-            team.update(dt)
+            team.flush_respawns()
+        t4 = clock()
+        phases = self.phases
+        phases.record('broadphase', t0 - t)
+        phases.record('shots', t1 - t0)
+        phases.record('tanks', t2 - t1)
+        phases.record('timers', t3 - t2)
+        phases.record('respawns', t4 - t3)
+
+    def sweep(self, dt):
+        """Find the tanks that shots, tanks and loose flags may touch in dt.
+
+        Each tank's box covers everywhere it can reach in dt, each shot's
+        the path it will take, and each loose flag's where it lies.  One
+        pass of self.broadphase pairs them up, and the result is kept in
+        self.contacts until the shots and tanks have moved.
+        """
+        items = []
+        rad = constants.TANKRADIUS
+        for tank, (x, y), speed in self.tank_states():
+            speed = abs(speed) + constants.LINEARACCEL * dt
+            reach = rad + speed * constants.TANKSPEED * dt + 1e-6
+            items.append((tank, 'tank',
+                          (x - reach, y - reach, x + reach, y + reach)))
+        if self.shot_pool is not None:
+            items.extend((shot, 'shot', box)
+                         for shot, box in self.shot_pool.boxes(dt))
+        else:
+            s_rad = constants.SHOTRADIUS
+            for shot in self.shots():
+                if (shot.status == constants.SHOTDEAD or
+                    shot.pos == constants.DEADZONE):
+                    continue
+                (x1, y1), (vx, vy) = shot.pos, shot.vel
+                x2, y2 = x1 + vx*dt, y1 + vy*dt
+                items.append((shot, 'shot',
+                              (min(x1, x2) - s_rad, min(y1, y2) - s_rad,
+                               max(x1, x2) + s_rad, max(y1, y2) + s_rad)))
+        f_rad = constants.FLAGRADIUS
+        for team in self.teams.values():
+            flag = team.flag
+            if flag.tank is None:
+                x, y = flag.pos
+                items.append((flag, 'flag',
+                              (x - f_rad, y - f_rad, x + f_rad, y + f_rad)))
+        self.broadphase.update(items)
+        pairs = self.broadphase.pairs()
+        contacts = {}
+        for tank1, tank2 in pairs[('tank', 'tank')]:
+            contacts.setdefault(tank1, []).append(tank2)
+            contacts.setdefault(tank2, []).append(tank1)
+        for kinds in ('shot', 'tank'), ('flag', 'tank'):
+            for obj, tank in pairs[kinds]:
+                contacts.setdefault(obj, []).append(tank)
+        self.swept = dict((obj, box) for obj, kind, box in items)
+        self.unswept = []
+        self.contacts = contacts
+
+    def tank_states(self):
+        """Return (tank, pos, speed) for each tank that is on the map.
+
+        With the numpy engine the positions and speeds are read from the
+        arrays in one go rather than through each tank.
+        """
+        arrays = self.tank_arrays
+        if arrays is None:
+            return [(tank, tank.pos, tank.speed) for tank in self.tanks()
+                    if tank.status != constants.TANKDEAD and
+                    tank.pos != constants.DEADZONE]
+        pos = arrays.pos[:arrays.count].tolist()
+        speed = arrays.speed[:arrays.count].tolist()
+        deadzone = list(constants.DEADZONE)
+        return [(tank, pos[tank.index], speed[tank.index])
+                for tank in self.tanks()
+                if tank.status != constants.TANKDEAD and
+                pos[tank.index] != deadzone]
+
+    def contacts_of(self, obj, box):
+        """Return the tanks the broadphase paired with obj, or None.
+
+        `box` is the extent obj now has.  The pairs only answer during
+        update, for an object that was swept and is still within its box;
+        otherwise None is returned and the caller asks self.tank_hash.
+        Tanks placed since the sweep are always included.
+        """
+        if self.contacts is None:
+            return None
+        swept = self.swept.get(obj)
+        if (swept is None or box[0] < swept[0] or box[1] < swept[1] or
+            box[2] > swept[2] or box[3] > swept[3]):
+            return None
+        tanks = self.contacts.get(obj, [])
+        if self.unswept:
+            tanks = tanks + self.unswept
+        return tanks
 
     def build_truegrid(self):
         """Builds occupancy grid with obstacles in self.obstacles.
 
-        Note: Occupancy grids with rotated obstalces not implemnted.
+        A cell of a rotated obstacle is occupied if its centre is inside the
+        obstacle, as looked up in self.obstacle_raster.
         """
         self.occgrid = [[0 for i in range(self.config.world.width)] 
                            for j in range(self.config.world.height)]
@@ -189,24 +507,20 @@ class Game(object):
                     for y in xrange(o.size[1]):
                         self.occgrid[x+lx[0]+offset_x][y+lx[1]+offset_y] = 1
             else:
-                # We didn't have enough time to implement occupancy grids with
-                # rotated obstalces; we figured it was low priority anyway
-                # because it would be really difficult for students to deal
-                # with.  If someone implements it sometime, great.  Until then,
-                # this is our workaround - the server returns a fail on a
-                # request for the occupancy grid if there are rotated
-                # obstacles.
-                self.occgrid = None
-                break
+                x1, y1, x2, y2 = o.geometry.box
+                for x in xrange(max(int(x1) + offset_x - 1, 0),
+                                min(int(x2) + offset_x + 1,
+                                    self.config.world.width)):
+                    for y in xrange(max(int(y1) + offset_y - 1, 0),
+                                    min(int(y2) + offset_y + 1,
+                                        self.config.world.height)):
+                        center = (x - offset_x + 0.5, y - offset_y + 0.5)
+                        if self.obstacle_raster.contains(center):
+                            self.occgrid[x][y] = 1
 
     def obstacle_at(self, x, y):
         """Checks for obstacle at given point."""
-        for obstacle in self.obstacles:
-            if obstacle.rot == 0:
-                return collisiontest.point_in_rect((x, y), obstacle.rect)
-            else:
-                return collisiontest.point_in_poly((x, y), obstacle.shape)
-        return False
+        return self.obstacle_raster.contains((x, y))
 
     def tanks(self):
         """Iterate through all tanks on the map."""
@@ -216,9 +530,144 @@ class Game(object):
 
     def shots(self):
         """Iterate through all shots on the map."""
-        for tank in self.tanks():
-            for shot in tank.shots:
-                yield shot
+        if self.shot_pool is not None:
+            return iter(self.shot_pool.shots[:])
+        return iter(self.shot_registry.shots[:])
+
+    def snapshot(self):
+        """Return the dynamic state of the game as a compact string.
+
+        Covers the tanks, shots, flags, scores, pending timers and the
+        game's random state; the map is not included.  Pass the result to
+        restore to go back to this point.
+        """
+        teams = []
+        for color in sorted(self.teams):
+            team = self.teams[color]
+            tanks = [(tank.pos[:], tank.rot, tank.speed, tank.goal_speed,
+                      tank.angvel, tank.goal_angvel, tank.status,
+                      tank.reload_due, tank.spawned) for tank in team.tanks]
+            flag = team.flag
+            teams.append((team.score.value, team.score.flags,
+                          tuple(flag.pos), self._ref(flag.tank), tanks))
+        shots = [(self._ref(shot.tank), getattr(shot, 'owner_slot', None),
+                  shot.pos, tuple(shot.vel), shot.rot, shot.distance)
+                 for shot in self.shots()]
+        timers = [(event.due, self._event_ref(event))
+                  for due, seq, event in sorted(self.timers.heap)
+                  if not event.cancelled]
+        state = (self.snapshot_version, self.timespent, self.end_game,
+                 self.taunt_msg, self.taunt_color, self.timers.now, teams,
+                 shots, timers, self.random.getstate())
+        return cPickle.dumps(state, cPickle.HIGHEST_PROTOCOL)
+
+    def restore(self, snapshot):
+        """Return the game to the state saved by snapshot."""
+        state = cPickle.loads(snapshot)
+        if state[0] != self.snapshot_version:
+            raise ValueError('unsupported snapshot version: %s' % state[0])
+        (version, self.timespent, self.end_game, self.taunt_msg,
+         self.taunt_color, now, teams, shots, timers, rng) = state
+        self.random.setstate(rng)
+
+        self.tank_hash.clear()
+        for color, (value, flags, flag_pos, carrier, tanks) in \
+                zip(sorted(self.teams), teams):
+            team = self.teams[color]
+            team.score.value = value
+            team.score.flags = flags
+            team.respawn_queue = []
+            for tank, tank_state in zip(team.tanks, tanks):
+                (tank.pos, tank.rot, tank.speed, tank.goal_speed, tank.angvel,
+                 tank.goal_angvel, tank.status, tank.reload_due,
+                 tank.spawned) = tank_state
+                tank.flag = None
+                tank.respawn_event = None
+                if tank.status == constants.TANKALIVE and \
+                        tank.pos != constants.DEADZONE:
+                    self.tank_hash.move(tank, tank.pos)
+        for color, team_state in zip(sorted(self.teams), teams):
+            flag = self.teams[color].flag
+            flag.pos = team_state[2]
+            flag.tank = self._deref(team_state[3])
+            if flag.tank is not None:
+                flag.tank.flag = flag
+
+        for shot in list(self.shots()):
+            shot.kill()
+        restored = []
+        for ref, owner_slot, pos, vel, rot, distance in shots:
+            tank = self._deref(ref)
+            if self.shot_pool is not None:
+                shot = PoolShot(tank, self.config)
+                shot.restore(pos, vel, rot, distance)
+            else:
+                shot = Shot(tank, self.config)
+                shot.pos, shot.vel, shot.rot, shot.distance = \
+                        pos, vel, rot, distance
+                self.shot_registry.add(shot)
+            restored.append((owner_slot, shot))
+            self.events.publish(events.ADD, shot)
+        if self.shot_pool is None:
+            # Put each tank's shots back in their old order.
+            slots = dict((shot, slot) for slot, shot in restored)
+            for owned in self.shot_registry.owned.values():
+                owned.sort(key=slots.get)
+                for i, shot in enumerate(owned):
+                    shot.owner_slot = i
+
+        self.timers.reset(now)
+        self.taunt_event = None
+        for due, ref in timers:
+            self._schedule_ref(due, ref)
+        for team in self.teams.values():
+            team.score.moved.update(team.tanks)
+
+    def fork(self):
+        """Return an independent copy of the game, for looking ahead.
+
+        The copy shares the map data but nothing else: stepping it with
+        update does not affect this game, its random state or its display.
+        """
+        game = Game(DetachedLoop(), self.config, static=self)
+        game.lockstep = None
+        game.restore(self.snapshot())
+        return game
+
+    def _ref(self, tank):
+        """Return a picklable reference to a tank (or None)."""
+        if tank is None:
+            return None
+        return tank.team.color, tank.team.tanks.index(tank)
+
+    def _deref(self, ref):
+        if ref is None:
+            return None
+        color, index = ref
+        return self.teams[color].tanks[index]
+
+    def _event_ref(self, event):
+        """Describe a pending timer event in picklable terms."""
+        name = event.callback.__name__
+        if name == 'queue_respawn':
+            return 'respawn', self._ref(event.args[0])
+        elif name == 'score_tanks':
+            return 'score', event.callback.__self__.team.color
+        elif name == 'clear_taunt':
+            return 'taunt', None
+        raise ValueError('cannot snapshot timer event %s' % name)
+
+    def _schedule_ref(self, due, ref):
+        kind, target = ref
+        if kind == 'respawn':
+            tank = self._deref(target)
+            tank.respawn_event = self.timers.schedule_at(
+                    due, tank.team.queue_respawn, tank)
+        elif kind == 'score':
+            score = self.teams[target].score
+            score.event = self.timers.schedule_at(due, score.score_tanks)
+        elif kind == 'taunt':
+            self.taunt_event = self.timers.schedule_at(due, self.clear_taunt)
 
     def dropFlag(self, flag):
         """Sets flag to None."""
@@ -230,6 +679,7 @@ class Game(object):
         """Return flag to base."""
         if flag.tank is not None:
             flag.tank.flag = None
+            flag.tank.team.score.moved.add(flag.tank)
         flag.tank = None
         flag.pos = flag.team.base.pos
 
@@ -241,8 +691,7 @@ class Game(object):
 
     def closest_base(self, pos):
         """Returns position of clossest base."""
-        items = tuple(sorted((collisiontest.get_dist(pos, base.center), base)
-                      for base in self.bases.values()))
+        items = self.base_grid.nearest(pos)
         if abs(items[0][0] - items[1][0]) < 50:
             return None
         return items[0][1]
@@ -251,13 +700,22 @@ class Game(object):
         """Set taunt message for given color."""
         if self.taunt_msg is None:
             self.taunt_msg = message
-            self.taunt_timer = 3
             self.taunt_color = color
+            self.taunt_event = self.timers.schedule(3, self.clear_taunt)
             return True
         return False
 
+    def clear_taunt(self):
+        self.taunt_msg = None
+        self.taunt_event = None
+        if not self.game_loop.headless:
+            self.game_loop.display.redraw()
+
     def write_msg(self, message):
-        self.game_loop.display.console.write(message)
+        if self.game_loop.headless:
+            logger.info(message)
+        else:
+            self.game_loop.display.console.write(message)
 
 class Team(object):
     """Team object:
@@ -273,7 +731,13 @@ class Team(object):
         if ntanks is None:
             ntanks = self.config['default_tanks']
 
-        self.tanks = [Tank(self, i, self.config) for i in xrange(ntanks)]
+        self.respawn_queue = []
+        if self.map.tank_arrays is not None:
+            tank_class = ArrayTank
+        else:
+            tank_class = Tank
+        self.tanks = [tank_class(self, i, self.config)
+                      for i in xrange(ntanks)]
         self.tanks_radius = constants.TANKRADIUS * ntanks * 3/2.0
         self.base = base
         base.team = self
@@ -292,52 +756,97 @@ class Team(object):
             self.velnoise = self.config['default_velnoise']
 
         self.score = Score(self)
-        self._obstacles = []
-        self.setup()
+        self.spawn_cells = self.free_spawn_cells()
+        if not self.spawn_cells:
+            logger.warning('no obstacle-free spawn cells near the %s base'
+                           % self.color)
         for item in self.tanks+[self.base, self.flag, self.score]:
-            self.map.inbox.append(item)
-
-    def setup(self):
-        """Initialize the cache of obstacles near the base."""
-        self._obstacles = []
-        for o in self.map.obstacles:
-            c = self.base.center
-            r = self.tanks_radius + constants.TANKRADIUS
-            if collisiontest.circle_to_circle((o.center, o.radius), (c, r)):
-                self._obstacles.append(o)
-
-    def respawn(self, tank, first=True):
+            self.map.events.publish(events.ADD, item)
+
+    def free_spawn_cells(self):
+        """Return the centres of the grid cells around the base that are
+        clear of obstacles and walls.
+
+        A cell is kept only if a tank centred anywhere in it would be clear,
+        so respawn can pick any point in a cell without checking obstacles
+        again.
+        """
+        size = constants.SPAWNCELL
+        reach = constants.TANKRADIUS + size * math.sqrt(0.5)
+        cx, cy = self.base.center
+        n = int(math.ceil(self.tanks_radius / size))
+        cells = []
+        for i in xrange(-n, n+1):
+            for j in xrange(-n, n+1):
+                if math.hypot(i, j) * size > self.tanks_radius:
+                    continue
+                pos = (cx + i*size, cy + j*size)
+                if self.clear_of_obstacles(pos, reach):
+                    cells.append(pos)
+        return cells
+
+    def respawn(self, tank):
         """Respawn a dead tank."""
+        self.respawn_tanks([tank])
 
-        tank.status = constants.TANKALIVE
-        tank.reset_speed()
-        if tank.pos != constants.DEADZONE:
-            return
+    def respawn_tanks(self, tanks):
+        """Respawn a batch of dead tanks.
 
-        tank.rot = random.uniform(0, 2*math.pi)
-        pos = self.spawn_position()
-        for i in xrange(constants.RESPAWNTRIES):
-            if self.check_position(pos, constants.TANKRADIUS):
-                break
-            pos = self.spawn_position()
-        else:
-            raise Exception("No workable spawning spots found for team %s"
-                            %self.color)
-        tank.pos = pos
+        Spots are sampled from the precomputed spawn cells, so only shots
+        and tanks need checking.  The shots are indexed once for the whole
+        batch.
+        """
+        shot_hash = spatial.SpatialHash(2 * constants.TANKRADIUS)
+        shot_hash.rebuild(self.map.shots())
+        rad = constants.TANKRADIUS
+        for tank in tanks:
+            tank.dead_timer = None
+            tank.status = constants.TANKALIVE
+            tank.reset_speed()
+            tank.spawned = True
+            if tank.pos != constants.DEADZONE:
+                continue
+
+            tank.rot = self.map.random.uniform(0, 2*math.pi)
+            for i in xrange(constants.RESPAWNTRIES):
+                if self.spawn_cells:
+                    pos = self.spawn_cell_position()
+                    shots = shot_hash.query(pos, rad + constants.SHOTRADIUS)
+                    if self.clear_of_objects(pos, rad, shots):
+                        break
+                else:
+                    pos = self.spawn_position()
+                    if self.check_position(pos, rad):
+                        break
+            else:
+                raise Exception("No workable spawning spots found for team %s"
+                                %self.color)
+            tank.pos = pos
+            self.map.tank_hash.move(tank, pos)
+            self.map.unswept.append(tank)
+            self.score.moved.add(tank)
 
     def check_position(self, pos, rad):
         """Check a position to see if it is safe to spawn a tank there."""
-        for o in self._obstacles:
-            if collisiontest.circle_to_poly((pos,rad), o.shape):
-                return False
-        for s in self.map.shots():
+        return (self.clear_of_obstacles(pos, rad) and
+                self.clear_of_objects(pos, rad, self.map.shots()))
+
+    def clear_of_objects(self, pos, rad, shots):
+        """Check the given shots and every tank for overlap with a circle."""
+        for s in shots:
             shot = (s.pos, constants.SHOTRADIUS)
             if collisiontest.circle_to_circle((pos,rad), shot):
                 return False
-        for t in self.map.tanks():
+        for t in self.map.tank_hash.query(pos, rad + constants.TANKRADIUS):
             tank = (t.pos, constants.TANKRADIUS)
             if collisiontest.circle_to_circle((pos,rad), tank):
                 return False
+        return True
+
+    def clear_of_obstacles(self, pos, rad):
+        """Check that a circle misses every obstacle and is on the map."""
+        if self.map.obstacle_raster.hits_circle(pos, rad):
+            return False
         off_map_left = pos[0]-rad < -self.config.world.size[0]/2
         off_map_bottom = pos[1]-rad < -self.config.world.size[1]/2
         off_map_right = pos[0]+rad > self.config.world.size[0]/2
@@ -348,17 +857,35 @@ class Team(object):
 
     def spawn_position(self):
         """Generate a random spawning position around the base."""
-        angle = random.uniform(0, 2*math.pi)
-        dist = random.uniform(0,1) * self.tanks_radius
+        angle = self.map.random.uniform(0, 2*math.pi)
+        dist = self.map.random.uniform(0,1) * self.tanks_radius
         return [self.base.center[0] + dist*math.cos(angle),
                 self.base.center[1] + dist*math.sin(angle)]
 
+    def spawn_cell_position(self):
+        """Generate a random point in a random free spawn cell."""
+        x, y = self.map.random.choice(self.spawn_cells)
+        half = constants.SPAWNCELL / 2.0
+        return [x + self.map.random.uniform(-half, half),
+                y + self.map.random.uniform(-half, half)]
+
+    def queue_respawn(self, tank):
+        """Respawn tank at the end of this update."""
+        self.respawn_queue.append(tank)
+
+    def flush_respawns(self):
+        """Respawn the queued tanks together."""
+        if self.respawn_queue:
+            tanks = [tank for tank in self.respawn_queue
+                     if tank.status == constants.TANKDEAD]
+            self.respawn_queue = []
+            self.respawn_tanks(tanks)
+
     def update(self, dt):
         """Update the tanks and flag."""
         for tank in self.tanks:
             tank.update(dt)
         self.flag.update(dt)
-        self.score.update(dt)
 
     def tank(self, id):
         """Get a tank based on its ID."""
@@ -416,12 +943,38 @@ class Tank(object):
         self.rot = 0
         self.callsign = self.team.color + str(tankid)
         self.status = constants.TANKDEAD
-        self.shots = []
-        self.reloadtimer = 0
+        self.timers = team.map.timers
+        self.reload_due = self.timers.now
+        self.respawn_event = None
         self.dead_timer = -1
         self.flag = None
         self.spawned = False
 
+    def _get_reloadtimer(self):
+        return max(0, self.reload_due - self.timers.now)
+
+    def _set_reloadtimer(self, value):
+        self.reload_due = self.timers.now + value
+
+    reloadtimer = property(_get_reloadtimer, _set_reloadtimer,
+                           doc="Seconds until the tank can shoot again.")
+
+    def _get_dead_timer(self):
+        if self.respawn_event is None:
+            return 0
+        return self.respawn_event.due - self.timers.now
+
+    def _set_dead_timer(self, value):
+        """Schedule the respawn value seconds from now; None cancels it."""
+        self.timers.cancel(self.respawn_event)
+        self.respawn_event = None
+        if value is not None:
+            self.respawn_event = self.timers.schedule(
+                value, self.team.queue_respawn, self)
+
+    dead_timer = property(_get_dead_timer, _set_dead_timer,
+                          doc="Seconds until a dead tank respawns.")
+
     def reset_speed(self):
         """Reset rot, speed and angvel to zero."""
         self.goal_speed = 0
@@ -438,14 +991,23 @@ class Tank(object):
         """Set the goal angular velocity."""
         self.goal_angvel = angvel
 
+    @property
+    def shots(self):
+        """The tank's live shots; copy the list before killing any."""
+        return self.team.map.shot_registry.owned_by(self)
+
+    def shot_count(self):
+        """Return the number of the tank's shots still in flight."""
+        return self.team.map.shot_registry.count(self)
+
     def shoot(self):
         """Tell the tank to shoot."""
         if self.reloadtimer > 0 or \
-                len(self.shots) >= self.config['max_shots']:
+                self.shot_count() >= self.config['max_shots']:
             return False
         shot = Shot(self, self.config)
-        self.shots.insert(0, shot)
-        self.team.map.inbox.append(shot)
+        self.team.map.shot_registry.add(shot)
+        self.team.map.events.publish(events.ADD, shot)
         self.reloadtimer = constants.RELOADTIME
         return True
 
@@ -453,27 +1015,22 @@ class Tank(object):
         """Kill tank."""
         self.status = constants.TANKDEAD
         self.pos = constants.DEADZONE
+        self.team.map.tank_hash.remove(self)
         self.dead_timer = self.config['respawn_time']
         self.team.score.score_tank(self)
         if self.flag:
             self.team.map.dropFlag(self.flag)
             self.flag = None
-        for shot in self.shots:
+        for shot in self.shots[:]:
             shot.kill()
-        self.shots = []
 
     def collision_at(self, pos):
         """Return True if collision at given position, and False otherwise."""
         rad = constants.TANKRADIUS
-        for obs in self.team.map.obstacles:
-            if collisiontest.circle_to_poly(((pos),rad), obs.shape):
-                return True
-        for tank in self.team.map.tanks():
-            if tank is self:
-                continue
-            if collisiontest.circle_to_circle((tank.pos, rad), (pos, rad)):
-                self.collide_tank(tank)
-                return True
+        for obs in self.team.map.obstacle_tree.circle(pos, rad):
+            return True
+        if self.hits_tank(pos):
+            return True
         at_left_wall = pos[0]-rad < -self.config.world.size[0]/2
         at_bottem_wall = pos[1]-rad < -self.config.world.size[1]/2
         at_right_wall = pos[0]+rad > self.config.world.size[0]/2
@@ -482,37 +1039,55 @@ class Tank(object):
             return True
         return False
 
+    def hits_tank(self, pos):
+        """Return True if the tank would overlap another tank at pos."""
+        rad = constants.TANKRADIUS
+        game = self.team.map
+        tanks = game.contacts_of(self, (pos[0] - rad, pos[1] - rad,
+                                        pos[0] + rad, pos[1] + rad))
+        if tanks is None:
+            tanks = game.tank_hash.query(pos, 2 * rad)
+        for tank in tanks:
+            if tank is self:
+                continue
+            if collisiontest.circle_to_circle((tank.pos, rad), (pos, rad)):
+                self.collide_tank(tank)
+                return True
+        return False
+
     def collide_tank(self, tank):
         """Pass - Not yet implimented."""
         pass
 
     def update(self, dt):
-        """Update the tank's position, status, velocities."""
-        for shot in self.shots:
-            shot.update(dt)
+        """Update the tank's position, status, velocities.
 
-        if self.reloadtimer > 0:
-            self.reloadtimer -= dt
+        The tank's shots are moved separately, by Game.update, and its
+        timers are events in Game.timers.
+        """
         if (self.pos == constants.DEADZONE and
             self.status != constants.TANKDEAD):
             self.team.respawn(self)
         if self.status == constants.TANKDEAD:
-            self.dead_timer -= dt
-            if self.dead_timer <= 0:
-                self.team.respawn(self, not self.spawned)
-                self.spawned = True
             return
 
         self.update_goals(dt)
         dx,dy = self.velocity()
-        if not self.collision_at((self.pos[0]+dx*dt,
-                                  self.pos[1]+dy*dt)):
-            self.pos[0] += dx*dt
-            self.pos[1] += dy*dt
-        elif not self.collision_at((self.pos[0], self.pos[1]+dy*dt)):
-            self.pos[1] += dy*dt
-        elif not self.collision_at((self.pos[0]+dx*dt, self.pos[1])):
-            self.pos[0] += dx*dt
+        self.move(dx*dt, dy*dt)
+
+    def move(self, dx, dy):
+        """Move by (dx, dy), sliding along an axis if the full move collides."""
+        x, y = self.pos
+        if not self.collision_at((x+dx, y+dy)):
+            self.pos = [x+dx, y+dy]
+        elif not self.collision_at((x, y+dy)):
+            self.pos = [x, y+dy]
+        elif not self.collision_at((x+dx, y)):
+            self.pos = [x+dx, y]
+        else:
+            return
+        self.team.map.tank_hash.move(self, self.pos)
+        self.team.score.moved.add(self)
 
     def update_goal(self, num, goal, by):
         """Update given num by given amount until equal to given goal."""
@@ -545,6 +1120,152 @@ class Tank(object):
             self.speed * math.sin(self.rot) * constants.TANKSPEED)
 
 
+def _array_property(name):
+    """Property reading and writing row `index` of TankArrays.<name>."""
+    def fget(self):
+        return float(getattr(self.arrays, name)[self.index])
+    def fset(self, value):
+        getattr(self.arrays, name)[self.index] = value
+    return property(fget, fset)
+
+
+class ArrayTank(Tank):
+    """Tank whose state lives in the game's engine.TankArrays.
+
+    Used with --engine=numpy.  Game.update advances the velocities and
+    rotation of all tanks at once and tests their moves against the
+    obstacles and walls, so update only has to check the other tanks.
+    """
+
+    rot = _array_property('rot')
+    speed = _array_property('speed')
+    goal_speed = _array_property('goal_speed')
+    angvel = _array_property('angvel')
+    goal_angvel = _array_property('goal_angvel')
+
+    def __init__(self, team, tankid, config):
+        self.arrays = team.map.tank_arrays
+        self.index = self.arrays.add(self, team)
+        Tank.__init__(self, team, tankid, config)
+
+    @property
+    def shots(self):
+        return self.team.map.shot_pool.owned_by(self.index)
+
+    def shot_count(self):
+        return self.team.map.shot_pool.owner_count.get(self.index, 0)
+
+    def _get_pos(self):
+        pos = self.arrays.pos[self.index].tolist()
+        if tuple(pos) == constants.DEADZONE:
+            return constants.DEADZONE
+        return pos
+
+    def _set_pos(self, pos):
+        self.arrays.pos[self.index] = pos
+
+    pos = property(_get_pos, _set_pos)
+
+    def _get_status(self):
+        return self._status
+
+    def _set_status(self, status):
+        self._status = status
+        self.arrays.alive[self.index] = (status == constants.TANKALIVE)
+
+    status = property(_get_status, _set_status)
+
+    def shoot(self):
+        """Tell the tank to shoot."""
+        if self.reloadtimer > 0 or \
+                self.shot_count() >= self.config['max_shots']:
+            return False
+        shot = PoolShot(self, self.config)
+        self.team.map.events.publish(events.ADD, shot)
+        self.reloadtimer = constants.RELOADTIME
+        return True
+
+    def update(self, dt):
+        """Update the tank's position; its shots are in the ShotPool.
+
+        The positions Tank.move would try come from TankArrays.moves when
+        Game.update has tested them; a tank that was not tested, such as
+        one waiting to respawn, moves the usual way.
+        """
+        if self.status == constants.TANKDEAD:
+            return
+        moves = self.arrays.moves
+        tested = None
+        if moves is not None and self.index < len(moves):
+            tested = moves[self.index]
+        if tested is None:
+            if self.pos == constants.DEADZONE:
+                self.team.respawn(self)
+            dx, dy = self.arrays.vel[self.index]
+            self.move(float(dx)*dt, float(dy)*dt)
+            return
+
+        rad = constants.TANKRADIUS
+        game = self.team.map
+        for pos, kind in zip(*tested):
+            if kind == engine.UNKNOWN:
+                kind = engine.CLEAR
+                for obs in game.obstacle_tree.circle(pos, rad):
+                    kind = engine.BLOCKED
+                    break
+            if kind == engine.CLEAR and not self.hits_tank(pos):
+                self.pos = pos
+                game.tank_hash.move(self, pos)
+                self.team.score.moved.add(self)
+                return
+
+
+class ShotRegistry(object):
+    """Every live Shot in the game, with per-tank lists.
+
+    Each shot records its index in `shots` as `slot` and its index in its
+    tank's list as `owner_slot`.  Removing a shot moves the last shot of
+    each list into the freed index, so adding, removing and counting are
+    all constant time.  The lists are in no particular order.
+    """
+
+    def __init__(self):
+        self.shots = []
+        self.owned = {}
+
+    def add(self, shot):
+        shot.slot = len(self.shots)
+        self.shots.append(shot)
+        owned = self.owned.setdefault(shot.tank, [])
+        shot.owner_slot = len(owned)
+        owned.append(shot)
+
+    def remove(self, shot):
+        """Remove shot if it is registered."""
+        if shot.slot is None:
+            return
+        self._swap_remove(self.shots, shot.slot, 'slot')
+        self._swap_remove(self.owned[shot.tank], shot.owner_slot,
+                          'owner_slot')
+        shot.slot = shot.owner_slot = None
+
+    def _swap_remove(self, items, index, attr):
+        last = items.pop()
+        if index < len(items):
+            items[index] = last
+            setattr(last, attr, index)
+
+    def owned_by(self, tank):
+        """Return the list of the tank's live shots."""
+        return self.owned.get(tank, [])
+
+    def count(self, tank):
+        return len(self.owned.get(tank, ()))
+
+    def __len__(self):
+        return len(self.shots)
+
+
 class Shot(object):
     """Shot object:
 
@@ -563,75 +1284,158 @@ class Shot(object):
         speed = constants.SHOTSPEED + tank.speed
         self.vel = (speed * math.cos(self.rot), speed * math.sin(self.rot))
         self.status = constants.SHOTALIVE
+        self.slot = None
+        self.owner_slot = None
 
     def update(self, dt):
-        """Move the shot."""
+        """Move the shot, stopping it at the first thing in its path."""
         if (self.status == constants.SHOTDEAD or
             self.pos == constants.DEADZONE):
             return
         self.distance += math.hypot(self.vel[0]*dt, self.vel[1]*dt)
-
-        ## do we need to lerp?
-        if self.vel[0]*dt > constants.TANKRADIUS*2:
-                p1 = self.pos[:]
-                p2 = [self.pos[0]+self.vel[0]*dt, self.pos[1]+self.vel[1]*dt]
-                self.check_line(p1,p2)
-        else:
-            self.pos[0] += self.vel[0]*dt
-            self.pos[1] += self.vel[1]*dt
-            self.check_collisions()
+        p1 = self.pos[:]
+        self.pos = [p1[0]+self.vel[0]*dt, p1[1]+self.vel[1]*dt]
+        self.check_path(p1, self.pos)
         if self.distance > constants.SHOTRANGE:
             self.kill()
 
-    def check_collisions(self):
-        """Check for collisions."""
-        s_rad = constants.SHOTRADIUS
-        t_rad = constants.TANKRADIUS
-        for obs in self.team.map.obstacles:
-            if collisiontest.circle_to_poly(((self.pos),s_rad), obs.shape):
-                return self.kill()
-        for tank in self.team.map.tanks():
-            if self in tank.shots:
-                continue
-            if collisiontest.circle_to_circle((tank.pos, t_rad),
-                                              (self.pos, s_rad)):
-                if tank.team == self.team and not self.config['friendly_fire']:
-                    continue
-                tank.kill()
-                return self.kill()
-        at_left_wall = self.pos[0]-s_rad < -self.config.world.size[0]/2
-        at_bottem_wall = self.pos[1]-s_rad < -self.config.world.size[1]/2
-        at_right_wall = self.pos[0]+s_rad > self.config.world.size[0]/2
-        at_top_wall = self.pos[1]+s_rad > self.config.world.size[1]/2
-        if at_left_wall or at_bottem_wall or at_right_wall or at_top_wall:
-            return self.kill()
+    def check_path(self, p1, p2):
+        """Check for collisions along the path from p1 to p2.
 
-    def check_line(self, p1, p2):
-        """Check for collisions."""
+        The shot is swept as a circle along the whole path, walking the grid
+        cells the path crosses, so it cannot tunnel through anything however
+        large dt is.  It stops at the first obstacle, tank or wall it
+        touches; a tank it touches first is killed.  The tanks come from
+        the broadphase pairs when Game.update has swept the shot.
+        """
         s_rad = constants.SHOTRADIUS
-        t_rad = constants.TANKRADIUS
-        for obs in self.team.map.obstacles:
-            if collisiontest.line_cross_rect((p1,p2), obs.rect):
-                return self.kill()
-        for tank in self.team.map.tanks():
-            if collisiontest.line_cross_circle((p1,p2), (tank.pos, t_rad + s_rad)):
-                if tank.team == self.team and not self.config['friendly_fire']:
+        game = self.team.map
+        line = (p1, p2)
+        seen = set()
+        hit = None
+        tanks = game.contacts_of(self, (min(p1[0], p2[0]) - s_rad,
+                                        min(p1[1], p2[1]) - s_rad,
+                                        max(p1[0], p2[0]) + s_rad,
+                                        max(p1[1], p2[1]) + s_rad))
+        if tanks is not None:
+            for tank in tanks:
+                hit = self.hit_tank(line, tank, hit)
+        for cell, t_exit in spatial.traverse(p1, p2, game.tank_hash.cell_size):
+            for key in spatial.neighbors(cell):
+                for obs in game.obstacle_grid.cells.get(key, ()):
+                    if obs in seen:
+                        continue
+                    seen.add(obs)
+                    t = collisiontest.sweep_circle_to_poly(line, s_rad,
+                                                           obs.shape)
+                    if t is not None and (hit is None or (t, 0) < hit[:2]):
+                        hit = (t, 0, obs)
+                if tanks is not None:
                     continue
-                tank.kill()
-                return self.kill()
-        at_left_wall = self.pos[0]-s_rad < -self.config.world.size[0]/2
-        at_bottem_wall = self.pos[1]-s_rad < -self.config.world.size[1]/2
-        at_right_wall = self.pos[0]+s_rad > self.config.world.size[0]/2
-        at_top_wall = self.pos[1]+s_rad > self.config.world.size[1]/2
-        if at_left_wall or at_bottem_wall or at_right_wall or at_top_wall:
-            return self.kill()
+                for tank in game.tank_hash.cells.get(key, ()):
+                    if tank not in seen:
+                        seen.add(tank)
+                        hit = self.hit_tank(line, tank, hit)
+            # Anything not found yet is first touched beyond this cell.
+            if hit is not None and hit[0] <= t_exit:
+                break
+        width, height = self.config.world.size
+        world = (-width/2, -height/2, width, height)
+        t = collisiontest.sweep_circle_leave_rect(line, s_rad, world)
+        if t is not None and (hit is None or (t, 2) < hit[:2]):
+            hit = (t, 2, None)
+        if hit is None:
+            return
+        t, kind, target = hit
+        self.pos = [p1[0] + t*(p2[0]-p1[0]), p1[1] + t*(p2[1]-p1[1])]
+        if kind == 1:
+            target.kill()
+        self.kill()
+
+    def hit_tank(self, line, tank, hit):
+        """Return the earlier of hit and where the path first touches tank.
+
+        Hits are (t, kind, target) as in check_path.
+        """
+        if tank is self.tank:
+            return hit
+        if tank.team == self.team and not self.config['friendly_fire']:
+            return hit
+        t = collisiontest.sweep_circle_to_circle(
+                line, constants.SHOTRADIUS, (tank.pos, constants.TANKRADIUS))
+        if t is not None and (hit is None or (t, 1) < hit[:2]):
+            hit = (t, 1, tank)
+        return hit
 
     def kill(self):
         """Remove the shot from the map."""
+        if self.status == constants.SHOTDEAD:
+            return
         self.status = constants.SHOTDEAD
-        self.tank.team.map.trash.append(self)
-        if self in self.tank.shots:
-            self.tank.shots.remove(self)
+        self.tank.team.map.events.publish(events.REMOVE, self)
+        self.tank.team.map.shot_registry.remove(self)
+
+
+class PoolShot(Shot):
+    """Shot whose state lives in the game's engine.ShotPool.
+
+    Used with --engine=numpy, where the pool moves all shots and checks
+    their collisions at once.
+    """
+
+    def __init__(self, tank, config):
+        self.config = config
+        self.tank = tank
+        self.team = tank.team
+        self.rot = tank.rot
+        self.status = constants.SHOTALIVE
+        self.pool = tank.team.map.shot_pool
+        self._pos = tank.pos[:]
+        speed = constants.SHOTSPEED + tank.speed
+        self._vel = (speed * math.cos(self.rot), speed * math.sin(self.rot))
+        self.slot = self.pool.add(self, self._pos, self._vel, tank.index)
+
+    def _get_pos(self):
+        if self.slot is not None:
+            self._pos = [float(x) for x in self.pool.pos[self.slot]]
+        return self._pos
+
+    def _set_pos(self, pos):
+        self.pool.pos[self.slot] = pos
+
+    pos = property(_get_pos, _set_pos)
+
+    @property
+    def vel(self):
+        return self._vel
+
+    @property
+    def distance(self):
+        if self.slot is None:
+            return constants.SHOTRANGE
+        return float(self.pool.distance[self.slot])
+
+    def update(self, dt):
+        """Shots are moved by ShotPool.update."""
+        pass
+
+    def restore(self, pos, vel, rot, distance):
+        """Overwrite the state of a freshly fired shot."""
+        self.rot = rot
+        self._vel = tuple(vel)
+        self.pool.pos[self.slot] = pos
+        self.pool.vel[self.slot] = vel
+        self.pool.speed[self.slot] = math.hypot(*vel)
+        self.pool.distance[self.slot] = distance
+
+    def kill(self):
+        """Remove the shot from the map."""
+        if self.status == constants.SHOTDEAD:
+            return
+        self._get_pos()
+        self.status = constants.SHOTDEAD
+        self.tank.team.map.events.publish(events.REMOVE, self)
+        self.pool.kill(self.slot)
 
 
 class Flag(object):
@@ -659,7 +1463,12 @@ class Flag(object):
             if collisiontest.circle_to_rect((self.pos, f_rad), rect):
                 self.tank.team.map.scoreFlag(self)
         else:
-            for tank in self.team.map.tanks():
+            game = self.team.map
+            tanks = game.contacts_of(self, (x - f_rad, y - f_rad,
+                                            x + f_rad, y + f_rad))
+            if tanks is None:
+                tanks = game.tank_hash.query(self.pos, f_rad + t_rad)
+            for tank in tanks:
                 if collisiontest.circle_to_circle((self.pos, f_rad),
                                                   (tank.pos, t_rad)):
                     if tank.team is self.team:
@@ -667,6 +1476,7 @@ class Flag(object):
                     else:
                         self.tank = tank
                         tank.flag = self
+                        tank.team.score.moved.add(tank)
                     return
 
 
@@ -718,18 +1528,21 @@ class Base(object):
         self.rect = (item.pos[0]-self.size[0]/2,
                      item.pos[1]-self.size[1]/2) + self.size
         self.shape = list(scale_rotate_poly(poly, 1, item.rot))
+        self.geometry = collisiontest.Geometry(self.shape)
         self.rot = item.rot
 
 
 class Obstacle(object):
     """Obstacle object:
 
-    Contains the logic and data for an obstacle on the map.
+    Contains the logic and data for an obstacle on the map.  `geometry` is
+    the shape compiled for the collision tests.
     """
 
     def __init__(self, item):
         self.center = self.pos = item.pos.asList()
         self.shape = ()
+        self.geometry = None
         self.rot = item.rot
         self.radius = 0
 
@@ -737,6 +1550,7 @@ class Obstacle(object):
         """Set shape"""
         self.shape = list(scale_rotate_poly(self.shape,
                          (self.radius + padding)/float(self.radius), 0))
+        self.geometry = collisiontest.Geometry(self.shape)
 
 
 class Box(Obstacle):
@@ -748,50 +1562,61 @@ class Box(Obstacle):
         self.size = tuple(x*2 for x in item.size.asList())
         self.shape = list(scale_rotate_poly((convertBoxtoPoly
                          (item.pos, self.size,item.rot)), 1, item.rot))
+        self.geometry = collisiontest.Geometry(self.shape)
         self.rect = (tuple(self.pos)+self.size)
 
 
 class Score(object):
-    """Score object: keeps track of a team's score."""
+    """Score object: keeps track of a team's score.
+
+    `moved` holds the tanks whose position or flag changed since they were
+    last scored.  Scoring any other tank again could not raise the value,
+    so score_tanks only looks at these.
+    """
 
     def __init__(self, team):
         self.team = team
         self.value = 0
         self.flags = 0
-        self.timer = 0
-
-    def update(self, dt):
-        """Update scores."""
-        self.timer += dt
-        if self.timer > 2:
-            self.timer = 0
-            for tank in self.team.tanks:
-                self.score_tank(tank)
+        self.moved = set()
+        # (center, distance from our base) of every other team's base
+        my_base = self.team.base.center
+        self.enemy_bases = {}
+        for color, base in self.team.map.bases.items():
+            if base is not self.team.base:
+                self.enemy_bases[color] = (base.center, collisiontest.get_dist(
+                        my_base, base.center))
+        self.enemy_grid = spatial.NearestGrid(
+                [(color, base.center)
+                 for color, base in self.team.map.bases.items()
+                 if color in self.enemy_bases],
+                self.team.config.world.size, constants.BASECELL)
+        self.event = self.team.map.timers.schedule(2, self.score_tanks)
+
+    def score_tanks(self):
+        """Score the tanks that moved, then again in 2 seconds."""
+        moved, self.moved = self.moved, set()
+        for tank in moved:
+            self.score_tank(tank)
+        self.event = self.team.map.timers.schedule(2, self.score_tanks)
 
     def score_tank(self, tank):
         """Score tank."""
-        my_base = self.team.base.center
         if tank.flag:
-            ebase = tank.flag.team.base
-            dist_to = collisiontest.get_dist(my_base, tank.flag.team.base.center)
+            my_base = self.team.base.center
+            dist_to = self.enemy_bases[tank.flag.team.color][1]
             dist_back = collisiontest.get_dist(tank.pos, my_base)
             more = 100.0 * (dist_to - dist_back)/dist_to
             if dist_back > dist_to:
                 more = 0
             self.setValue(500 + more)
         else:
-            closest = None
-            for color,team in self.team.map.teams.items():
-                if team is self.team:
-                    continue
-                dst = collisiontest.get_dist(tank.pos, team.base.center)
-                if closest is None or dst < closest[0]:
-                    closest = dst, team.base
+            closest = self.enemy_grid.nearest(tank.pos)
             if not closest:
                 logger.warning("no closest found... %s" % self.team.color)
                 return False
-            total_dist = collisiontest.get_dist(my_base, closest[1].center)
-            dist_to = collisiontest.get_dist(tank.pos, closest[1].center)
+            dist_to, color = closest[0]
+            total_dist = self.enemy_bases[color][1]
             if dist_to > total_dist:
                 return
             self.setValue(100.0 * (total_dist-dist_to)/total_dist)
@@ -800,6 +1625,7 @@ class Score(object):
         """Udates flag status."""
         self.value = 0
         self.flags += 1
+        self.moved.update(self.team.tanks)
 
     def lostFlag(self):
         """Udates flag status."""
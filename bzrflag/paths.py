@@ -32,5 +32,7 @@ FONT = 'VeraMono.ttf'
 DATA_DIR = os.path.abspath(os.path.join(os.path.split(__file__)[0],
                            '..', 'data'))
 FONT_FILE = os.path.join(DATA_DIR, FONT)
+MAPS_DIR = os.path.abspath(os.path.join(os.path.split(__file__)[0],
+                           '..', 'maps'))
 
 # vim: et sw=4 sts=4
@@ -91,6 +91,58 @@ class Server(asyncore.dispatcher):
             self.sock.close()
 
 
+class Lockstep(object):
+    """Coordinates lockstep mode across all of the teams' Handlers.
+
+    Each Handler that completes the handshake joins.  A "step" request is
+    held without a reply until every joined Handler has one pending (or the
+    deadline, counted from the first pending request, has passed).  The game
+    loop then advances the game by `ticks` ticks and calls release, which
+    answers every pending request.
+    """
+
+    def __init__(self, ticks, deadline=None):
+        self.ticks = ticks
+        self.deadline = deadline
+        self.handlers = set()
+        self.waiting = []
+        self.first_request = None
+
+    def join(self, handler):
+        self.handlers.add(handler)
+
+    def leave(self, handler):
+        self.handlers.discard(handler)
+        if handler in self.waiting:
+            self.waiting.remove(handler)
+
+    def request(self, handler):
+        """Queue a step request; return False if one is already pending."""
+        if handler in self.waiting:
+            return False
+        if not self.waiting:
+            self.first_request = time.time()
+        self.waiting.append(handler)
+        return True
+
+    def ready(self):
+        """Return True if the game should advance now."""
+        if not self.waiting:
+            return False
+        if len(self.waiting) >= len(self.handlers):
+            return True
+        if self.deadline is None:
+            return False
+        return time.time() - self.first_request >= self.deadline
+
+    def release(self):
+        """Answer all pending step requests."""
+        waiting, self.waiting = self.waiting, []
+        self.first_request = None
+        for handler in waiting:
+            handler.push('ok\n')
+
+
 class Handler(asynchat.async_chat):
     """Handler which implements the BZRC protocol with one client.
 
@@ -141,7 +193,7 @@ class Handler(asynchat.async_chat):
         """
         if self.config['telnet_console']:
             message = (self.team.color + ' : ' + self.input_buffer + '\n')
-            self.game.game_loop.display.console.write(message)
+            self.game.game_loop.write_message(message)
         logger.debug(self.team.color + ' : ' + self.input_buffer + '\n')
         args = self.input_buffer.split()
         self.input_buffer = ''
@@ -166,6 +218,8 @@ class Handler(asynchat.async_chat):
                     return
             elif args == ['agent', '1']:
                 self.established = True
+                if self.game.lockstep:
+                    self.game.lockstep.join(self)
             else:
                 self.bad_handshake()
 
@@ -175,6 +229,8 @@ class Handler(asynchat.async_chat):
         self.close()
 
     def close(self):
+        if self.game.lockstep:
+            self.game.lockstep.leave(self)
         self.closed_callback()
         asynchat.async_chat.close(self)
 
@@ -302,6 +358,28 @@ class Handler(asynchat.async_chat):
         self.team.angvel(tankid, value)
         self.push('ok\n')
 
+    def bzrc_step(self, args):
+        """step
+
+        Wait for the game to advance (lockstep mode only).
+
+        The reply is held until every connected team has sent step, or until
+        the server's step deadline passes.  The game then advances by a fixed
+        number of ticks and the server answers "ok".  Returns "fail" if the
+        server is not in lockstep mode or a step is already pending.
+        """
+        try:
+            command, = args
+        except ValueError, TypeError:
+            self.invalid_args(args)
+            return
+        self.ack(command)
+        lockstep = self.game.lockstep
+        if lockstep is None:
+            self.push('fail lockstep mode is not enabled\n')
+        elif not lockstep.request(self):
+            self.push('fail step already pending\n')
+
     def bzrc_teams(self, args):
         """teams
         Request a list of teams.
@@ -370,9 +448,6 @@ class Handler(asynchat.async_chat):
             self.invalid_args(args)
             return
 
-        if self.game.occgrid is None:
-            raise Exception('occgrid not currently compatible with rotated '
-                            'obstacles')
         if tank.status == constants.TANKDEAD:
             self.push('fail\n')
             return
@@ -504,10 +579,12 @@ class Handler(asynchat.async_chat):
         self.ack(command)
 
         response = ['begin\n']
-        for shot in self.game.shots():
-            x, y = shot.pos
-            vx, vy = shot.vel
-            response.append('shot %s %s %s %s\n' % (x, y, vx, vy))
+        if self.game.shot_pool is not None:
+            records = self.game.shot_pool.records()
+        else:
+            records = [shot.pos + list(shot.vel) for shot in self.game.shots()]
+        for record in records:
+            response.append('shot %s %s %s %s\n' % tuple(record))
         response.append('end\n')
         self.push(''.join(response))
 
@@ -546,7 +623,7 @@ class Handler(asynchat.async_chat):
             data['id'] = i
             data['callsign'] = tank.callsign
             data['status'] = tank.status
-            data['shots_avail'] = constants.MAXSHOTS-len(tank.shots)
+            data['shots_avail'] = constants.MAXSHOTS-tank.shot_count()
             data['reload'] = tank.reloadtimer
             data['flag'] = tank.flag and tank.flag.team.color or '-'
             data['x'] = int(tank.pos[0])
@@ -587,7 +664,7 @@ class Handler(asynchat.async_chat):
                 data['color'] = color
                 data['callsign'] = tank.callsign
                 data['status'] = tank.status
-                data['shots_avail'] = constants.MAXSHOTS-len(tank.shots)
+                data['shots_avail'] = constants.MAXSHOTS-tank.shot_count()
                 data['reload'] = tank.reloadtimer
                 data['flag'] = tank.flag and tank.flag.team.color or '-'
 
@@ -0,0 +1,560 @@
+# Bzrflag
+# Copyright 2008-2011 Brigham Young University
+#
+# This file is part of Bzrflag.
+#
+# Bzrflag is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Bzrflag is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bzrflag.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Inquiries regarding any further use of Bzrflag, please contact the Copyright
+# Licensing Office, Brigham Young University, 3760 HBLL, Provo, UT 84602,
+# (801) 422-9339 or 422-3821, e-mail copyright@byu.edu.
+
+"""Spatial indexes for BZRFlag game objects.
+
+The indexes only narrow down which objects are worth testing; the exact
+tests are still done with :mod:`collisiontest`.
+
+"""
+__author__ = "BYU AML Lab <kseppi@byu.edu>"
+__copyright__ = "Copyright 2008-2011 Brigham Young University"
+__license__ = "GNU GPL"
+
+import math
+import logging
+
+import collisiontest
+
+logger = logging.getLogger('spatial')
+
+
+class SpatialHash(object):
+    """Uniform grid that buckets objects by the cell holding their position.
+
+    Cells are kept in lists (not sets) so that queries return objects in a
+    reproducible order.
+
+    >>> grid = SpatialHash(10)
+    >>> grid.move('a', (1, 1))
+    >>> grid.move('b', (25, 1))
+    >>> list(grid.query((5, 5), 6))
+    ['a']
+    >>> sorted(grid.query((15, 0), 10))
+    ['a', 'b']
+    >>> grid.move('a', (24, 2))
+    >>> list(grid.query((5, 5), 6))
+    []
+    >>> grid.remove('b')
+    >>> list(grid.query((25, 0), 1))
+    ['a']
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        self.keys = {}
+
+    def cell(self, pos):
+        """Return the key of the cell holding the given point."""
+        return (int(math.floor(pos[0] / self.cell_size)),
+                int(math.floor(pos[1] / self.cell_size)))
+
+    def move(self, obj, pos):
+        """Insert obj at pos, or move it there if it is already present."""
+        key = self.cell(pos)
+        old = self.keys.get(obj)
+        if old == key:
+            return
+        if old is not None:
+            self.cells[old].remove(obj)
+            if not self.cells[old]:
+                del self.cells[old]
+        self.keys[obj] = key
+        self.cells.setdefault(key, []).append(obj)
+
+    def remove(self, obj):
+        """Remove obj if present."""
+        key = self.keys.pop(obj, None)
+        if key is not None:
+            self.cells[key].remove(obj)
+            if not self.cells[key]:
+                del self.cells[key]
+
+    def clear(self):
+        self.cells = {}
+        self.keys = {}
+
+    def rebuild(self, objects):
+        """Replace the contents with the given objects at their `pos`."""
+        self.clear()
+        for obj in objects:
+            self.move(obj, obj.pos)
+
+    def query(self, pos, radius):
+        """Iterate the objects in every cell within radius of pos."""
+        x, y = pos
+        return self.query_box(x - radius, y - radius, x + radius, y + radius)
+
+    def query_box(self, x1, y1, x2, y2):
+        """Iterate the objects in every cell overlapping the given box."""
+        size = self.cell_size
+        cells = self.cells
+        for i in xrange(int(math.floor(x1 / size)),
+                        int(math.floor(x2 / size)) + 1):
+            for j in xrange(int(math.floor(y1 / size)),
+                            int(math.floor(y2 / size)) + 1):
+                for obj in cells.get((i, j), ()):
+                    yield obj
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class SweepAndPrune(object):
+    """Broadphase that finds which boxes of moving objects overlap.
+
+    Every object has a kind and an axis-aligned box (xmin, ymin, xmax,
+    ymax).  The boxes are kept sorted by their left edge.  update re-sorts
+    them by insertion sort, which is nearly linear when the objects moved
+    little since the last update; pairs then sweeps the list once and
+    returns the overlapping pairs of the kinds asked for.
+
+    >>> sap = SweepAndPrune([('tank', 'tank'), ('shot', 'tank')])
+    >>> sap.update([('a', 'tank', (0, 0, 2, 2)), ('b', 'tank', (1, 1, 3, 3)),
+    ...             ('s', 'shot', (2.5, 0, 4, 0.5)),
+    ...             ('c', 'tank', (3.5, 0, 6, 1))])
+    >>> sorted(sap.pairs().items())
+    [(('shot', 'tank'), [('s', 'c')]), (('tank', 'tank'), [('a', 'b')])]
+    >>> sap.update([('a', 'tank', (4, 0, 6, 2)), ('c', 'tank', (3.5, 0, 6, 1))])
+    >>> [entry[5] for entry in sap.entries]
+    ['c', 'a']
+    >>> sap.pairs()[('tank', 'tank')]
+    [('c', 'a')]
+    """
+
+    def __init__(self, kinds):
+        self.kinds = list(kinds)
+        # [xmin, ymin, xmax, ymax, kind, obj], sorted by xmin
+        self.entries = []
+
+    def update(self, items):
+        """Replace the objects and boxes with the (obj, kind, box) items.
+
+        Objects keep their place in the sorted list from the last update;
+        new ones are added at the end, and those not given are dropped.
+        """
+        present = {}
+        for obj, kind, box in items:
+            present[obj] = (kind, box)
+        entries = []
+        for entry in self.entries:
+            item = present.pop(entry[5], None)
+            if item is not None:
+                kind, box = item
+                entry[0:5] = box[0], box[1], box[2], box[3], kind
+                entries.append(entry)
+        for obj, kind, box in items:
+            if obj in present:
+                entries.append([box[0], box[1], box[2], box[3], kind, obj])
+        for i in xrange(1, len(entries)):
+            entry = entries[i]
+            x = entry[0]
+            j = i - 1
+            while j >= 0 and entries[j][0] > x:
+                entries[j + 1] = entries[j]
+                j -= 1
+            entries[j + 1] = entry
+        self.entries = entries
+
+    def pairs(self):
+        """Return {(kind1, kind2): [(obj1, obj2), ...]} of overlapping boxes.
+
+        Boxes that only touch count as overlapping.  Each pair is listed
+        once, in the order of the kinds given to the constructor.
+        """
+        found = dict((kinds, []) for kinds in self.kinds)
+        active = []
+        for entry in self.entries:
+            x1, y1, x2, y2, kind, obj = entry
+            active = [other for other in active if other[2] >= x1]
+            for other in active:
+                if other[1] <= y2 and y1 <= other[3]:
+                    pairs = found.get((other[4], kind))
+                    if pairs is not None:
+                        pairs.append((other[5], obj))
+                        continue
+                    pairs = found.get((kind, other[4]))
+                    if pairs is not None:
+                        pairs.append((obj, other[5]))
+            active.append(entry)
+        return found
+
+
+def neighbors(cell):
+    """Return the cell and the eight cells around it.
+
+    >>> neighbors((0, 0))[:3]
+    [(-1, -1), (-1, 0), (-1, 1)]
+    """
+    i, j = cell
+    return [(i + di, j + dj) for di in (-1, 0, 1) for dj in (-1, 0, 1)]
+
+
+def traverse(p1, p2, cell_size):
+    """Walk the grid cells crossed by the segment from p1 to p2, in order.
+
+    This is the Amanatides-Woo grid traversal.  Yields (cell, t_exit) where
+    t_exit in [0, 1] is how far along the segment it leaves the cell.
+
+    >>> [(cell, round(t, 3)) for cell, t in traverse((1, 1), (25, 1), 10)]
+    [((0, 0), 0.375), ((1, 0), 0.792), ((2, 0), 1.0)]
+    >>> [cell for cell, t in traverse((5, 5), (-5, 13), 10)]
+    [(0, 0), (-1, 0), (-1, 1)]
+    """
+    size = float(cell_size)
+    x, y = p1[0] / size, p1[1] / size
+    dx, dy = p2[0] / size - x, p2[1] / size - y
+    i, j = int(math.floor(x)), int(math.floor(y))
+    end = int(math.floor(x + dx)), int(math.floor(y + dy))
+    inf = float('inf')
+    step_i = 1 if dx > 0 else -1
+    step_j = 1 if dy > 0 else -1
+    if dx:
+        delta_i = abs(1 / dx)
+        next_i = ((i + 1 - x) if dx > 0 else (x - i)) * delta_i
+    else:
+        delta_i = next_i = inf
+    if dy:
+        delta_j = abs(1 / dy)
+        next_j = ((j + 1 - y) if dy > 0 else (y - j)) * delta_j
+    else:
+        delta_j = next_j = inf
+    while True:
+        t_exit = min(next_i, next_j, 1.0)
+        yield (i, j), t_exit
+        if (i, j) == end or t_exit >= 1.0:
+            return
+        if next_i < next_j:
+            i += step_i
+            next_i += delta_i
+        else:
+            j += step_j
+            next_j += delta_j
+
+
+class NearestGrid(object):
+    """Raster of the points that may be nearest to each cell of the world.
+
+    Built once from a list of (key, point) pairs.  Each cell lists the
+    points that can be among the `k` nearest to some position in the cell,
+    which is usually just k of them, so a query measures only a few
+    distances.  Positions off the raster consider every point.
+
+    >>> grid = NearestGrid([('a', (-10, 0)), ('b', (10, 0))], (40, 40), 5)
+    >>> grid.nearest((-10, 5))
+    [(5.0, 'a')]
+    >>> [key for key, point in grid.candidates((-10, 5))]
+    ['a']
+    """
+
+    def __init__(self, points, size, cell_size, k=1):
+        self.points = list(points)
+        self.k = k
+        self.cell_size = float(cell_size)
+        self.origin = (-size[0] / 2.0, -size[1] / 2.0)
+        self.cols = int(math.ceil(size[0] / self.cell_size))
+        self.rows = int(math.ceil(size[1] / self.cell_size))
+        self.cells = []
+        for i in xrange(self.cols):
+            column = []
+            for j in xrange(self.rows):
+                x1 = self.origin[0] + i * self.cell_size
+                y1 = self.origin[1] + j * self.cell_size
+                box = (x1, y1, x1 + self.cell_size, y1 + self.cell_size)
+                column.append(self._candidates(box))
+            self.cells.append(column)
+
+    def _candidates(self, box):
+        """Return the points that are among the k nearest somewhere in box."""
+        if not self.points:
+            return []
+        x1, y1, x2, y2 = box
+        near = []
+        far = []
+        for key, (x, y) in self.points:
+            near.append(math.hypot(max(x1 - x, 0, x - x2),
+                                   max(y1 - y, 0, y - y2)))
+            far.append(math.hypot(max(abs(x - x1), abs(x - x2)),
+                                  max(abs(y - y1), abs(y - y2))))
+        limit = sorted(far)[min(self.k, len(far)) - 1]
+        return [point for point, dist in zip(self.points, near)
+                if dist <= limit]
+
+    def candidates(self, pos):
+        """Return the (key, point) pairs that may be nearest to pos."""
+        i = int(math.floor((pos[0] - self.origin[0]) / self.cell_size))
+        j = int(math.floor((pos[1] - self.origin[1]) / self.cell_size))
+        if 0 <= i < self.cols and 0 <= j < self.rows:
+            return self.cells[i][j]
+        return self.points
+
+    def nearest(self, pos):
+        """Return [(distance, key)] for the k points nearest to pos.
+
+        They are sorted nearest first; equal distances keep the order of
+        the points given to the constructor.
+        """
+        found = [(collisiontest.get_dist(pos, point), key)
+                 for key, point in self.candidates(pos)]
+        found.sort(key=lambda item: item[0])
+        return found[:self.k]
+
+
+class ObstacleGrid(object):
+    """Uniform grid of static obstacles.
+
+    Each obstacle is listed in every cell that its bounding box overlaps.
+    The cell keys match a SpatialHash of the same cell size, so both can be
+    consulted while walking a segment with traverse.
+    """
+
+    def __init__(self, obstacles, cell_size):
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        for obstacle in obstacles:
+            x1, y1, x2, y2 = obstacle.geometry.box
+            for i in xrange(int(math.floor(x1 / self.cell_size)),
+                            int(math.floor(x2 / self.cell_size)) + 1):
+                for j in xrange(int(math.floor(y1 / self.cell_size)),
+                                int(math.floor(y2 / self.cell_size)) + 1):
+                    self.cells.setdefault((i, j), []).append(obstacle)
+
+
+def bounding_box(points):
+    """Return (xmin, ymin, xmax, ymax) of the given points.
+
+    >>> bounding_box(((0, 1), (4, -2), (3, 3)))
+    (0, -2, 4, 3)
+    """
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+# How a convex polygon covers a raster cell.
+EMPTY, FULL, MIXED = 'empty', 'full', 'mixed'
+
+
+def cover(shape, box, eps=1e-6):
+    """Return EMPTY, FULL or MIXED for how a convex polygon covers a box.
+
+    EMPTY and FULL are only returned with a margin of eps to spare, so
+    every point of the box is then clearly outside or inside the polygon.
+
+    >>> square = ((0, 0), (4, 0), (4, 4), (0, 4))
+    >>> cover(square, (1, 1, 2, 2)), cover(square, (5, 0, 6, 1))
+    ('full', 'empty')
+    >>> cover(square, (3, 3, 5, 5)), cover(square, (4, 0, 5, 1))
+    ('mixed', 'mixed')
+    """
+    x1, y1, x2, y2 = box
+    px1, py1, px2, py2 = bounding_box(shape)
+    if px1 > x2 + eps or px2 < x1 - eps or py1 > y2 + eps or py2 < y1 - eps:
+        return EMPTY
+    corners = ((x1, y1), (x2, y1), (x2, y2), (x1, y2))
+    area = 0
+    for (ax, ay), (bx, by) in zip(shape, shape[1:] + shape[:1]):
+        area += ax*by - bx*ay
+    orient = 1 if area > 0 else -1
+    full = True
+    for (ax, ay), (bx, by) in zip(shape, shape[1:] + shape[:1]):
+        length = math.hypot(bx - ax, by - ay)
+        if not length:
+            continue
+        # Signed distance of each corner from the edge, positive inside.
+        dists = [orient * ((bx-ax)*(cy-ay) - (by-ay)*(cx-ax)) / length
+                 for cx, cy in corners]
+        if max(dists) < -eps:
+            return EMPTY
+        if min(dists) <= eps:
+            full = False
+    return FULL if full else MIXED
+
+
+class ObstacleRaster(object):
+    """Bitmap of the world marking where the static obstacles are.
+
+    Each cell is None if no obstacle comes near it, True if it lies inside
+    an obstacle, or else the list of obstacles whose edges pass through
+    it.  Queries are answered from the cell alone, except in those boundary
+    cells, where the exact polygon tests decide.  The obstacles must be
+    convex (boxes, rotated or not); positions off the map are passed on to
+    the ObstacleTree.
+    """
+
+    def __init__(self, tree, size, cell_size):
+        self.tree = tree
+        self.cell_size = float(cell_size)
+        self.origin = (-size[0] / 2.0, -size[1] / 2.0)
+        self.cols = int(math.ceil(size[0] / self.cell_size))
+        self.rows = int(math.ceil(size[1] / self.cell_size))
+        self.cells = [[None] * self.rows for i in xrange(self.cols)]
+        for obstacle in tree.obstacles:
+            shape = list(obstacle.shape)
+            x1, y1, x2, y2 = obstacle.geometry.box
+            i1, j1 = self.cell((x1 - 1e-6, y1 - 1e-6))
+            i2, j2 = self.cell((x2 + 1e-6, y2 + 1e-6))
+            for i in xrange(max(i1, 0), min(i2, self.cols - 1) + 1):
+                for j in xrange(max(j1, 0), min(j2, self.rows - 1) + 1):
+                    cell = self.cells[i][j]
+                    if cell is True:
+                        continue
+                    kind = cover(shape, self.box(i, j))
+                    if kind == FULL:
+                        self.cells[i][j] = True
+                    elif kind == MIXED:
+                        if cell is None:
+                            self.cells[i][j] = [obstacle]
+                        else:
+                            cell.append(obstacle)
+
+    def cell(self, pos):
+        """Return the (column, row) of the cell holding pos."""
+        return (int(math.floor((pos[0] - self.origin[0]) / self.cell_size)),
+                int(math.floor((pos[1] - self.origin[1]) / self.cell_size)))
+
+    def box(self, i, j):
+        """Return (xmin, ymin, xmax, ymax) of a cell."""
+        x = self.origin[0] + i * self.cell_size
+        y = self.origin[1] + j * self.cell_size
+        return x, y, x + self.cell_size, y + self.cell_size
+
+    def contains(self, pos):
+        """Return True if the point is inside an obstacle."""
+        i, j = self.cell(pos)
+        if not (0 <= i < self.cols and 0 <= j < self.rows):
+            for obstacle in self.tree.point(pos):
+                return True
+            return False
+        cell = self.cells[i][j]
+        if cell is None or cell is True:
+            return bool(cell)
+        for obstacle in cell:
+            if obstacle.geometry.contains(pos):
+                return True
+        return False
+
+    def hits_circle(self, pos, radius):
+        """Return True if the circle overlaps an obstacle."""
+        x, y = pos
+        i1, j1 = self.cell((x - radius, y - radius))
+        i2, j2 = self.cell((x + radius, y + radius))
+        if i1 < 0 or j1 < 0 or i2 >= self.cols or j2 >= self.rows:
+            for obstacle in self.tree.circle(pos, radius):
+                return True
+            return False
+        edges = []
+        for i in xrange(i1, i2 + 1):
+            for j in xrange(j1, j2 + 1):
+                cell = self.cells[i][j]
+                if cell is None:
+                    continue
+                bx1, by1, bx2, by2 = self.box(i, j)
+                if math.hypot(max(bx1 - x, 0, x - bx2),
+                              max(by1 - y, 0, y - by2)) > radius:
+                    continue
+                if cell is True:
+                    return True
+                edges.extend(cell)
+        for obstacle in set(edges):
+            if obstacle.geometry.hits_circle(pos, radius):
+                return True
+        return False
+
+
+class ObstacleTree(object):
+    """Bounding-volume hierarchy over static obstacles.
+
+    The tree is built once from the obstacles' compiled `geometry`.  Each node
+    is a tuple (box, left, right, items): internal nodes have children and
+    items of None, leaves have no children and a list of (box, obstacle)
+    pairs.  The query methods return obstacles whose polygons really do
+    satisfy the test, in a reproducible order.
+    """
+
+    leaf_size = 4
+
+    def __init__(self, obstacles):
+        self.obstacles = list(obstacles)
+        items = [(o.geometry.box, o) for o in self.obstacles]
+        self.root = self._build(items) if items else None
+
+    def _build(self, items):
+        box = (min(b[0] for b, o in items), min(b[1] for b, o in items),
+               max(b[2] for b, o in items), max(b[3] for b, o in items))
+        if len(items) <= self.leaf_size:
+            return (box, None, None, items)
+        # Split at the median centre along the longer side.
+        axis = 0 if box[2] - box[0] >= box[3] - box[1] else 1
+        items = sorted(items, key=lambda item: item[0][axis] +
+                                               item[0][axis + 2])
+        half = len(items) // 2
+        return (box, self._build(items[:half]), self._build(items[half:]),
+                None)
+
+    def query_box(self, x1, y1, x2, y2):
+        """Iterate the obstacles whose bounding boxes overlap the box."""
+        if self.root is None:
+            return
+        stack = [self.root]
+        while stack:
+            box, left, right, items = stack.pop()
+            if box[0] > x2 or box[2] < x1 or box[1] > y2 or box[3] < y1:
+                continue
+            if items is None:
+                stack.append(right)
+                stack.append(left)
+                continue
+            for b, obstacle in items:
+                if not (b[0] > x2 or b[2] < x1 or b[1] > y2 or b[3] < y1):
+                    yield obstacle
+
+    def circle(self, pos, radius):
+        """Iterate the obstacles that overlap the circle."""
+        x, y = pos
+        for obstacle in self.query_box(x - radius, y - radius,
+                                       x + radius, y + radius):
+            if obstacle.geometry.hits_circle(pos, radius):
+                yield obstacle
+
+    def point(self, pos):
+        """Iterate the obstacles that contain the point."""
+        x, y = pos
+        for obstacle in self.query_box(x, y, x, y):
+            if obstacle.geometry.contains(pos):
+                yield obstacle
+
+    def segment(self, p1, p2):
+        """Iterate the obstacles that the line segment crosses or enters."""
+        box = (min(p1[0], p2[0]), min(p1[1], p2[1]),
+               max(p1[0], p2[0]), max(p1[1], p2[1]))
+        for obstacle in self.query_box(*box):
+            if obstacle.geometry.crosses_line((p1, p2)):
+                yield obstacle
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+# vim: et sw=4 sts=4
@@ -0,0 +1,139 @@
+# Bzrflag
+# Copyright 2008-2011 Brigham Young University
+#
+# This file is part of Bzrflag.
+#
+# Bzrflag is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Bzrflag is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bzrflag.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Inquiries regarding any further use of Bzrflag, please contact the Copyright
+# Licensing Office, Brigham Young University, 3760 HBLL, Provo, UT 84602,
+# (801) 422-9339 or 422-3821, e-mail copyright@byu.edu.
+
+"""Timing of the phases of each tick.
+
+The main loop and Game.update record how long each of their phases took.
+Only the most recent samples of each phase are kept, and percentiles are
+worked out from them when a summary is asked for, so recording a sample
+costs no more than storing a number.
+
+"""
+__author__ = "BYU AML Lab <kseppi@byu.edu>"
+__copyright__ = "Copyright 2008-2011 Brigham Young University"
+__license__ = "GNU GPL"
+
+import math
+import logging
+
+logger = logging.getLogger('stats')
+
+# Number of recent samples kept for each phase.
+WINDOW = 1000
+
+
+class Samples(object):
+    """Ring buffer of the last `size` durations of one phase.
+
+    >>> samples = Samples(4)
+    >>> for x in 5, 1, 4, 2, 3:
+    ...     samples.add(x)
+    >>> samples.count, samples.percentile(50), samples.percentile(100)
+    (5, 2, 4)
+    """
+
+    def __init__(self, size=WINDOW):
+        self.size = size
+        self.values = []
+        self.index = 0
+        self.count = 0
+
+    def add(self, value):
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            self.values[self.index] = value
+            self.index = (self.index + 1) % self.size
+        self.count += 1
+
+    def percentile(self, p, ordered=None):
+        """Return the p-th percentile (nearest rank) of the kept samples."""
+        if ordered is None:
+            ordered = sorted(self.values)
+        if not ordered:
+            return 0
+        rank = int(math.ceil(p / 100.0 * len(ordered)))
+        return ordered[max(rank, 1) - 1]
+
+
+class Phases(object):
+    """Rolling samples for every named phase of a tick."""
+
+    percentiles = (50, 95, 99)
+
+    def __init__(self, size=WINDOW):
+        self.size = size
+        self.samples = {}
+        self.order = []
+
+    def record(self, name, seconds):
+        """Add one duration of the named phase."""
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = Samples(self.size)
+            self.order.append(name)
+        samples.add(seconds)
+
+    def summary(self):
+        """Return {phase: {'count': n, 'p50': s, 'p95': s, 'p99': s,
+        'max': s}}, with the times in seconds."""
+        result = {}
+        for name, samples in self.samples.items():
+            ordered = sorted(samples.values)
+            row = {'count': samples.count, 'max': ordered[-1]}
+            for p in self.percentiles:
+                row['p%d' % p] = samples.percentile(p, ordered)
+            result[name] = row
+        return result
+
+    def lines(self):
+        """Return the summary as text, one line per phase, in milliseconds."""
+        summary = self.summary()
+        lines = []
+        for name in self.order:
+            row = summary[name]
+            lines.append('%-10s n=%-8d p50=%.3f p95=%.3f p99=%.3f max=%.3f ms'
+                         % (name, row['count'], 1000 * row['p50'],
+                            1000 * row['p95'], 1000 * row['p99'],
+                            1000 * row['max']))
+        return lines
+
+    def log(self):
+        """Write the summary to the log."""
+        for line in self.lines():
+            logger.info(line)
+
+
+def show():
+    """Let the summaries through even if only warnings are being logged.
+
+    For when they were asked for, with --stats-interval or SIGUSR1.
+    """
+    if not logger.isEnabledFor(logging.INFO):
+        logger.setLevel(logging.INFO)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+# vim: et sw=4 sts=4
@@ -0,0 +1,181 @@
+# Bzrflag
+# Copyright 2008-2011 Brigham Young University
+#
+# This file is part of Bzrflag.
+#
+# Bzrflag is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Bzrflag is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bzrflag.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Inquiries regarding any further use of Bzrflag, please contact the Copyright
+# Licensing Office, Brigham Young University, 3760 HBLL, Provo, UT 84602,
+# (801) 422-9339 or 422-3821, e-mail copyright@byu.edu.
+
+"""Game-time event scheduler, and a wall-clock governor for the main loop.
+
+Timers that used to be counted down by every object on every tick are
+instead kept in one priority queue, so that each tick only costs as much as
+the events that actually fall due.
+
+"""
+__author__ = "BYU AML Lab <kseppi@byu.edu>"
+__copyright__ = "Copyright 2008-2011 Brigham Young University"
+__license__ = "GNU GPL"
+
+import math
+import time
+import heapq
+import logging
+
+logger = logging.getLogger('timers')
+
+
+class Event(object):
+    """A scheduled callback; returned by Scheduler.schedule."""
+
+    __slots__ = ('due', 'callback', 'args', 'cancelled')
+
+    def __init__(self, due, callback, args):
+        self.due = due
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+
+class Scheduler(object):
+    """Heap of events keyed by the game time they fall due.
+
+    Events due at the same time fire in the order they were scheduled.  A
+    callback runs with `now` set to its event's due time, so anything it
+    schedules is timed from the exact expiry, however large the step.
+
+    >>> timers = Scheduler()
+    >>> def ring(name):
+    ...     print name, timers.now
+    >>> e = timers.schedule(2, ring, 'b')
+    >>> e = timers.schedule(1, ring, 'a')
+    >>> timers.cancel(timers.schedule(1.5, ring, 'never'))
+    >>> timers.advance(5)
+    a 1
+    b 2
+    >>> timers.now, len(timers)
+    (5, 0)
+    """
+
+    def __init__(self, now=0):
+        self.reset(now)
+
+    def reset(self, now=0):
+        """Drop every pending event and set the clock."""
+        self.now = now
+        self.heap = []
+        self.seq = 0
+        self.pending = 0
+
+    def schedule(self, delay, callback, *args):
+        """Call callback(*args) once delay seconds of game time pass."""
+        return self.schedule_at(self.now + delay, callback, *args)
+
+    def schedule_at(self, due, callback, *args):
+        """Call callback(*args) once the game time reaches due."""
+        event = Event(due, callback, args)
+        heapq.heappush(self.heap, (due, self.seq, event))
+        self.seq += 1
+        self.pending += 1
+        return event
+
+    def cancel(self, event):
+        """Stop a pending event from firing; it is dropped lazily."""
+        if event is not None and not event.cancelled:
+            event.cancelled = True
+            self.pending -= 1
+
+    def advance(self, dt):
+        """Move time forward by dt, firing every event that falls due."""
+        end = self.now + dt
+        heap = self.heap
+        while heap and heap[0][0] <= end:
+            due, seq, event = heapq.heappop(heap)
+            if event.cancelled:
+                continue
+            event.cancelled = True
+            self.pending -= 1
+            self.now = max(self.now, due)
+            event.callback(*event.args)
+        self.now = end
+
+    def __len__(self):
+        return self.pending
+
+
+class Governor(object):
+    """Paces a loop to a target number of iterations per wall-clock second.
+
+    Each call to wait spends whatever is left of the current period in
+    poll(timeout), which should return early when it has work to do (as
+    asyncore.loop does).  A loop that falls behind starts its next period
+    at once rather than trying to catch up.  The achieved rate and the
+    jitter (standard deviation of the period) are tracked as it runs.
+    """
+
+    def __init__(self, rate, clock=time.time):
+        self.period = 1.0 / rate
+        self.clock = clock
+        self.deadline = None
+        self.last = None
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def wait(self, poll):
+        """Call poll(timeout) until the current period is over."""
+        now = self.clock()
+        if self.deadline is None:
+            self.deadline = now
+        self.deadline = max(self.deadline + self.period, now)
+        while True:
+            remaining = self.deadline - self.clock()
+            if remaining <= 0:
+                break
+            poll(remaining)
+        self.mark(self.clock())
+
+    def mark(self, now):
+        """Record that an iteration began at time now."""
+        if self.last is not None:
+            period = now - self.last
+            self.count += 1
+            delta = period - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (period - self.mean)
+        self.last = now
+
+    @property
+    def rate(self):
+        """Achieved iterations per second."""
+        if not self.mean:
+            return 0.0
+        return 1.0 / self.mean
+
+    @property
+    def jitter(self):
+        """Standard deviation of the period, in seconds."""
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self.m2 / (self.count - 1))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+# vim: et sw=4 sts=4
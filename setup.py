@@ -11,9 +11,11 @@ setup(name="BZRFlag",
       author_email="kseppi@byu.edu",
       url="http://code.google.com/p/bzrflag/",
       packages=['bzrflag'],
+      scripts=['bin/bzrflag', 'bin/bzrflag-batch', 'bin/bzrflag-bench'],
       include_package_data = True,
       package_data = {'': ['*.png', '*.txt', '*.ttf']},
       test_suite="tests",
+      extras_require={'numpy': ['numpy']},
       data_files=[('data', ['data/std_ground.png'])],
       classifiers=['Development Status :: 4 - Beta',
                    'Operating System :: POSIX :: Linux',
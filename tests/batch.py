@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# Bzrflag
+# Copyright 2008-2011 Brigham Young University
+#
+# This file is part of Bzrflag.
+#
+# Bzrflag is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Bzrflag is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bzrflag.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Inquiries regarding any further use of Bzrflag, please contact the Copyright
+# Licensing Office, Brigham Young University, 3760 HBLL, Provo, UT 84602,
+# (801) 422-9339 or 422-3821, e-mail copyright@byu.edu.
+
+"""Unit test for BZRFlag module batch.py."""
+
+__author__ = "BYU AML Lab <kseppi@byu.edu>"
+__copyright__ = "Copyright 2008-2011 Brigham Young University"
+__license__ = "GNU GPL"
+
+import os
+import unittest
+
+from bzrflag import batch, config
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        path = os.path.dirname(__file__)
+        self.world = os.path.join(path, "..", "maps", "test.bzw")
+        self.matrix = {'maps': [self.world],
+                       'seeds': [1, 2],
+                       'options': ['--time-limit=1', '--max-speed', '--test']}
+
+    def testExpandMatrix(self):
+        self.matrix['teams'] = [{}, {'red': 'agent {host} {port}'}]
+        jobs = batch.expand_matrix(self.matrix)
+        self.assertEquals(len(jobs), 4)
+        self.assertEquals(jobs[1]['teams'], {'red': 'agent {host} {port}'})
+        self.assertEquals(jobs[2]['seed'], 2)
+        self.assertRaises(config.ArgumentError, batch.expand_matrix, {})
+
+    def testGameArgs(self):
+        job = batch.expand_matrix(self.matrix)[0]
+        args = batch.game_args(job)
+        self.assertIn('--seed=1', args)
+        self.assertIn('--red-port=0', args)
+        self.assertTrue(args.index('--max-speed') < args.index('--red-port=0'))
+
+    def testRunGame(self):
+        job = batch.expand_matrix(self.matrix)[0]
+        result = batch.run_game(job)
+        self.assertEquals(sorted(result['scores']),
+                          ['blue', 'green', 'purple', 'red'])
+        self.assertEquals(result['ticks'], 50)
+
+    def testBadTeam(self):
+        self.matrix['teams'] = [{'rogue': 'agent {host} {port}'}]
+        job = batch.expand_matrix(self.matrix)[0]
+        result = batch.run_job(job)
+        self.assertIn('ArgumentError', result['error'])
+
+    def testRunBatch(self):
+        jobs = batch.expand_matrix(self.matrix)
+        results = batch.run_batch(jobs, 2)
+        self.assertEquals([r['seed'] for r in results], [1, 2])
+        self.assertEquals(batch.run_game(jobs[1])['scores'],
+                          results[1]['scores'])
+
+# vim: et sw=4 sts=4
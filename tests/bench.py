@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# Bzrflag
+# Copyright 2008-2011 Brigham Young University
+#
+# This file is part of Bzrflag.
+#
+# Bzrflag is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Bzrflag is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bzrflag.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Inquiries regarding any further use of Bzrflag, please contact the Copyright
+# Licensing Office, Brigham Young University, 3760 HBLL, Provo, UT 84602,
+# (801) 422-9339 or 422-3821, e-mail copyright@byu.edu.
+
+"""Unit test for BZRFlag module bench.py."""
+
+__author__ = "BYU AML Lab <kseppi@byu.edu>"
+__copyright__ = "Copyright 2008-2011 Brigham Young University"
+__license__ = "GNU GPL"
+
+import os
+import json
+import unittest
+
+from bzrflag import bench, constants
+
+
+class BenchTest(unittest.TestCase):
+
+    def setUp(self):
+        path = os.path.dirname(__file__)
+        self.world = os.path.join(path, "..", "maps", "four_ls.bzw")
+
+    def layout(self, seed):
+        g = bench.make_game(self.world, 5, seed)
+        bench.populate(g, seed)
+        return [(t.pos, t.rot, t.goal_speed) for t in g.tanks()], \
+               sorted(s.pos for s in g.shots())
+
+    def testPopulateIsSeeded(self):
+        self.assertEquals(self.layout(3), self.layout(3))
+        self.assertNotEquals(self.layout(3), self.layout(4))
+
+    def testTimed(self):
+        calls = []
+        result = bench.timed(calls.append, [(1,), (2,)], 2, 0.001)
+        self.assertEquals(result['ops'], 2)
+        self.assertEquals(calls[:4], [1, 2, 1, 2])
+        self.assertEquals(len(calls) % 2, 0)
+        self.assertTrue(result['ops_per_sec'] > 0)
+        result = bench.timed(calls.append, [], 2)
+        self.assertEquals(result['ops_per_sec'], None)
+
+    def testRun(self):
+        results = bench.run([self.world], densities=[2, 6], ticks=3,
+                            repeat=1)
+        results = json.loads(json.dumps(results))
+        record = results['maps']['four_ls.bzw']
+        self.assertEquals(record['obstacles'], 13)
+        self.assertEquals([d['tanks'] for d in record['densities']],
+                          [8, 24])
+        for density in record['densities']:
+            self.assertIn('circle_to_poly', density['primitives'])
+            self.assertEquals(density['primitives']['Game.sweep']['ops'], 1)
+            self.assertEquals(density['update']['ticks'], 3)
+            self.assertTrue(density['update']['seconds_per_tick'] > 0)
+            self.assertIn('tanks', density['update']['phases'])
+
+    def testParseArgs(self):
+        options, maps = bench.parse_args(['--densities=1,4'])
+        self.assertEquals(options.densities, [1, 4])
+        self.assertTrue(len(maps) > 1)
+        self.assertTrue(all(m.endswith('.bzw') for m in maps))
+        self.assertEquals(options.timestep, constants.TIMESTEP)
+
+# vim: et sw=4 sts=4
@@ -2,6 +2,7 @@
 import unittest
 import doctest
 import math
+import random
 
 from bzrflag import collisiontest
 
@@ -71,4 +72,104 @@ class CollisionTest(unittest.TestCase):
         self.assertEqual(self.c.dist_to_line((2,0), line), math.sqrt(2))
 
 
+class GeometryTest(unittest.TestCase):
+    """Compiled polygons agree with the plain functions."""
+
+    def setUp(self):
+        self.c = collisiontest
+        self.random = random.Random(3)
+        self.polys = [((4.,2.), (4.,-1.), (-2.,-1.), (-2.,2.)),
+                      ((0.,-3.), (3.,0.), (0.,3.), (-3.,0.)),
+                      ((0.,0.), (4.,2.), (4.,8.), (0.,7.), (2.,6.), (0.,5.))]
+
+    def points(self, poly):
+        points = [(self.random.uniform(-5, 9), self.random.uniform(-5, 9))
+                  for i in xrange(400)]
+        points += list(poly)
+        points += [((ax+bx)/2, (ay+by)/2) for (ax, ay), (bx, by)
+                   in zip(poly, poly[1:] + poly[:1])]
+        return points
+
+    def testKinds(self):
+        self.assertEqual([self.c.Geometry(p).aligned for p in self.polys],
+                         [True, False, False])
+        self.assertEqual([self.c.Geometry(p).convex for p in self.polys],
+                         [True, True, False])
+
+    def testMatchesFunctions(self):
+        for poly in self.polys:
+            g = self.c.Geometry(poly)
+            points = self.points(poly)
+            for p in points:
+                self.assertEqual(g.contains(p), self.c.point_in_poly(p, poly))
+                r = self.random.uniform(0, 2)
+                self.assertEqual(g.hits_circle(p, r),
+                                 self.c.circle_to_poly((p, r), poly))
+                line = (p, self.random.choice(points))
+                self.assertEqual(g.crosses_line(line),
+                                 self.c.line_cross_poly(line, poly))
+
+    def testRect(self):
+        rect = (-2., -1., 6., 3.)
+        poly = self.polys[0]
+        for p in self.points(poly):
+            self.assertEqual(self.c.point_in_rect(p, rect),
+                             self.c.point_in_poly(p, poly))
+            self.assertEqual(self.c.circle_to_rect((p, 1.), rect),
+                             self.c.circle_to_poly((p, 1.), poly))
+            line = (p, (3., 5.))
+            self.assertEqual(self.c.line_cross_rect(line, rect),
+                             self.c.line_cross_poly(line, poly))
+
+
+@unittest.skipIf(collisiontest.numpy is None, 'numpy is not installed')
+class BatchTest(unittest.TestCase):
+    """The batch functions agree with the scalar ones."""
+
+    def setUp(self):
+        self.c = collisiontest
+        self.random = random.Random(7)
+        self.polys = [((0.,0.), (4.,2.), (4.,8.), (0.,7.), (2.,6.), (0.,5.)),
+                      ((-3.,-3.), (1.,-3.), (1.,-1.), (-3.,-1.)),
+                      ((6.,1.), (8.,4.), (5.,6.))]
+
+    def point(self):
+        return (self.random.uniform(-4, 9), self.random.uniform(-4, 9))
+
+    def testPoints(self):
+        points = [self.point() for i in xrange(500)]
+        points += [p for poly in self.polys for p in poly]
+        for poly in self.polys:
+            expected = [self.c.point_in_poly(p, poly) for p in points]
+            self.assertEqual(list(self.c.points_in_poly(points, poly)),
+                             expected)
+            for line in zip(poly, poly[1:]):
+                dists = self.c.dists_to_line(points, line)
+                for p, dist in zip(points, dists):
+                    self.assertAlmostEqual(dist, self.c.dist_to_line(p, line))
+
+    def testCircles(self):
+        centers = [self.point() for i in xrange(300)]
+        radii = [self.random.uniform(0, 2) for p in centers]
+        for poly in self.polys:
+            expected = [self.c.circle_to_poly((p, r), poly)
+                        for p, r in zip(centers, radii)]
+            self.assertEqual(list(self.c.circles_to_poly(centers, radii, poly)),
+                             expected)
+        mask = self.c.circles_to_circles(centers, radii, centers[:40], 1)
+        self.assertEqual(mask.shape, (300, 40))
+        for i, (p, r) in enumerate(zip(centers, radii)):
+            for j, q in enumerate(centers[:40]):
+                self.assertEqual(mask[i, j],
+                                 self.c.circle_to_circle((p, r), (q, 1)))
+
+    def testSegments(self):
+        segments = [(self.point(), self.point()) for i in xrange(300)]
+        mask = self.c.segments_cross_polys(segments, self.polys)
+        self.assertEqual(mask.shape, (300, len(self.polys)))
+        for i, line in enumerate(segments):
+            for j, poly in enumerate(self.polys):
+                self.assertEqual(mask[i, j], self.c.line_cross_poly(line, poly))
+
+
 # vim: et sw=4 sts=4
@@ -49,6 +49,14 @@ class ConfigTest(unittest.TestCase):
         args = '--world=test_bad.bzw --red-port=50189'.split()
         self.assertRaises(config.ArgumentError, config.Config,args)
 
+    def testTimestep(self):
+        args = ['--world='+self.world, '--timestep=-1']
+        self.assertRaises(config.ArgumentError, config.Config, args)
+        config_file = config.Config(['--world='+self.world, '--max-speed',
+                                     '--timestep=0.05'])
+        self.assertEquals(config_file['timestep'], 0.05)
+        self.assertTrue(config_file['max_speed'])
+
     def testOptions(self):
         self.assertEquals(self.config_file['world'], self.world)
         self.assertEquals(self.config_file['red_port'], int(self.port))
@@ -28,9 +28,15 @@ __copyright__ = "Copyright 2008-2011 Brigham Young University"
 __license__ = "GNU GPL"
 
 import os
+import random
+import signal
+import logging
+import datetime
+import threading
 
 import unittest
-from bzrflag import game, config
+from bzrflag import game, config, constants, collisiontest, engine, events
+from bzrflag import stats
 
 
 class GameTest(unittest.TestCase):
@@ -40,7 +46,7 @@ class GameTest(unittest.TestCase):
         world = "--world="+os.path.join(path, "..", "maps", "test.bzw")
         self.config = config.Config(['--test', world])
         self.game_loop = game.GameLoop(self.config)
-        self.game_loop.update_game()
+        self.game_loop.step_game(0)
         self.team = "red"
 
     def tearDown(self):
@@ -48,8 +54,419 @@ class GameTest(unittest.TestCase):
 
     def testInitialization(self):
         self.team = self.game_loop.game.teams['green']
-        self.assertNotEqual(self.team._obstacles,[])
+        self.assertNotEqual(self.team.spawn_cells,[])
         self.assertEquals(len(list(self.game_loop.game.tanks())), 40)
         self.assertEquals(len(list(self.game_loop.game.shots())), 0)
 
+    def testTankHash(self):
+        g = self.game_loop.game
+        for team in g.teams.values():
+            team.speed(0, 1)
+        for i in xrange(50):
+            g.update(0.1)
+        alive = [t for t in g.tanks() if t.status == 'alive']
+        self.assertEquals(len(g.tank_hash), len(alive))
+        for tank in alive:
+            self.assertIn(tank, list(g.tank_hash.query(tank.pos, 0)))
+
+    def testFixedTimestep(self):
+        path = os.path.dirname(__file__)
+        world = "--world="+os.path.join(path, "..", "maps", "test.bzw")
+        cfg = config.Config(['--test', '--max-speed', '--timestep=0.25',
+                             world])
+        game_loop = game.GameLoop(cfg)
+        for i in xrange(4):
+            game_loop.update_game()
+        self.assertEquals(game_loop.ticks, 4)
+        self.assertEquals(game_loop.game.timespent, 1.0)
+
+    def testLockstepSockets(self):
+        path = os.path.dirname(__file__)
+        world = "--world="+os.path.join(path, "..", "maps", "test.bzw")
+        cfg = config.Config(['--test', '--lockstep=1', '--tick-rate=50',
+                             world])
+        game_loop = game.GameLoop(cfg)
+        timeouts = []
+        game_loop.poll = timeouts.append
+        lockstep = game_loop.game.lockstep
+        lockstep.ready = lambda: False
+        game_loop.service_sockets(None)
+        lockstep.ready = lambda: True
+        game_loop.service_sockets(None)
+        self.assertEquals(timeouts, [0.02, 0])
+
+    def testSubsteps(self):
+        game_loop = self.game_loop
+        now = datetime.datetime.utcnow()
+        game_loop.timestamp = now - datetime.timedelta(seconds=0.05)
+        game_loop.update_game()
+        self.assertEquals(game_loop.ticks, 3)
+        self.assertAlmostEqual(game_loop.game.timespent, 0.04)
+        self.assertTrue(game_loop.accumulator < game_loop.timestep)
+        now = datetime.datetime.utcnow()
+        game_loop.timestamp = now - datetime.timedelta(seconds=1)
+        game_loop.update_game()
+        self.assertEquals(game_loop.ticks, 8)
+        self.assertTrue(game_loop.dropped_time > 0.8)
+        self.assertAlmostEqual(game_loop.game.timespent + game_loop.accumulator
+                               + game_loop.dropped_time, 1.05, 2)
+
+    def testShotNoTunneling(self):
+        g = self.game_loop.game
+        tank = g.teams['red'].tanks[0]
+        # Only the obstacle should stop the shot, wherever the tanks spawned.
+        g.tank_hash.clear()
+        shot = game.Shot(tank, self.config)
+        shot.pos = [180, 0]
+        shot.vel = (0, constants.SHOTSPEED)
+        shot.update(2.0)
+        self.assertEquals(shot.status, constants.SHOTDEAD)
+        self.assertTrue(0 < shot.pos[1] < 70)
+
+    def testRespawnBatch(self):
+        g = self.game_loop.game
+        team = g.teams['green']
+        self.assertTrue(team.spawn_cells)
+        for pos in team.spawn_cells:
+            self.assertTrue(team.clear_of_obstacles(pos, constants.TANKRADIUS))
+        for tank in team.tanks:
+            tank.kill()
+        team.respawn_tanks(team.tanks)
+        for tank in team.tanks:
+            self.assertEquals(tank.status, constants.TANKALIVE)
+            others = list(g.tank_hash.query(tank.pos, 2*constants.TANKRADIUS))
+            self.assertIn(tank, others)
+            for other in others:
+                if other is not tank:
+                    self.assertFalse(collisiontest.circle_to_circle(
+                        (tank.pos, constants.TANKRADIUS),
+                        (other.pos, constants.TANKRADIUS)))
+
+    def testTimers(self):
+        g = self.game_loop.game
+        tank = g.teams['red'].tanks[0]
+        self.assertTrue(tank.shoot())
+        self.assertFalse(tank.shoot())
+        self.assertAlmostEqual(tank.reloadtimer, constants.RELOADTIME)
+        tank.kill()
+        self.assertEquals(tank.dead_timer, self.config['respawn_time'])
+        g.update(self.config['respawn_time'] + constants.RELOADTIME)
+        self.assertEquals(tank.status, constants.TANKALIVE)
+        self.assertEquals(tank.reloadtimer, 0)
+        self.assertTrue(tank.shoot())
+
+    def testShotRegistry(self):
+        g = self.game_loop.game
+        tank1, tank2 = g.teams['red'].tanks[:2]
+        shots = [game.Shot(tank, self.config)
+                 for tank in (tank1, tank2, tank1, tank1)]
+        for shot in shots:
+            g.shot_registry.add(shot)
+        self.assertEquals(len(g.shot_registry), 4)
+        self.assertEquals(tank1.shot_count(), 3)
+        removed = []
+        g.events.subscribe(events.REMOVE, removed.append)
+        shots[0].kill()
+        shots[0].kill()
+        self.assertEquals(removed, [shots[0]])
+        self.assertEquals(len(g.shot_registry), 3)
+        self.assertEquals(sorted(tank1.shots), sorted(shots[2:]))
+        self.assertEquals(sorted(g.shots()), sorted(shots[1:]))
+        for shot in g.shot_registry.shots:
+            self.assertTrue(g.shot_registry.shots[shot.slot] is shot)
+            owned = g.shot_registry.owned_by(shot.tank)
+            self.assertTrue(owned[shot.owner_slot] is shot)
+        tank1.kill()
+        self.assertEquals(tank1.shot_count(), 0)
+        self.assertEquals(list(g.shots()), [shots[1]])
+
+    def testIncrementalScore(self):
+        g = self.game_loop.game
+        for team in g.teams.values():
+            team.speed(0, 1)
+            team.speed(1, -1)
+            team.angvel(1, 0.5)
+        for i in xrange(20):
+            g.update(0.5)
+            for team in g.teams.values():
+                value = team.score.value
+                for tank in team.tanks:
+                    if tank not in team.score.moved:
+                        team.score.score_tank(tank)
+                self.assertEquals(team.score.value, value)
+        self.assertTrue(any(team.score.value for team in g.teams.values()))
+
+    def testSweep(self):
+        g = self.game_loop.game
+        rad = constants.TANKRADIUS
+        for team in g.teams.values():
+            team.speed(0, 1)
+            team.shoot(0)
+        g.update(0.5)
+        self.assertTrue(g.contacts is None)
+        g.sweep(2.0)
+        tanks = [t for t in g.tanks() if t.status == constants.TANKALIVE]
+        for tank in tanks:
+            x, y = tank.pos
+            near = g.contacts_of(tank, (x - rad, y - rad, x + rad, y + rad))
+            for other in tanks:
+                if other is not tank and collisiontest.get_dist(
+                        tank.pos, other.pos) <= 2 * rad + 2 * 25 * 2.0:
+                    self.assertIn(other, near)
+            far = (x + 100 - rad, y - rad, x + 100 + rad, y + rad)
+            self.assertTrue(g.contacts_of(tank, far) is None)
+        for shot in g.shots():
+            x, y = shot.pos
+            near = g.contacts_of(shot, (x - 0.5, y - 0.5, x + 0.5, y + 0.5))
+            self.assertIn(shot.tank, near)
+
+    def state(self, g):
+        tanks = [(t.status, t.pos, t.rot, t.speed) for t in g.tanks()]
+        shots = sorted((s.pos, s.vel) for s in g.shots())
+        scores = [(c, t.score.value) for c, t in sorted(g.teams.items())]
+        return tanks, shots, scores, g.timers.now, len(g.timers)
+
+    def testSnapshotRestore(self):
+        g = self.game_loop.game
+        for team in g.teams.values():
+            team.speed(0, 1)
+            team.shoot(1)
+        g.teams['red'].tanks[2].kill()
+        snapshot = g.snapshot()
+        expected = self.state(g)
+        for i in xrange(30):
+            g.update(0.1)
+        after = self.state(g)
+        self.assertNotEqual(after, expected)
+        g.restore(snapshot)
+        self.assertEquals(self.state(g), expected)
+        for i in xrange(30):
+            g.update(0.1)
+        self.assertEquals(self.state(g), after)
+
+    def testFork(self):
+        g = self.game_loop.game
+        g.teams['red'].speed(0, 1)
+        g.teams['red'].shoot(0)
+        fork = g.fork()
+        self.assertTrue(fork.obstacle_tree is g.obstacle_tree)
+        added = []
+        g.events.subscribe(events.ADD, added.append)
+        for i in xrange(20):
+            fork.update(0.1)
+            g.update(0.1)
+        self.assertEquals(self.state(fork), self.state(g))
+        fork.teams['red'].tanks[0].kill()
+        self.assertEquals(g.teams['red'].tanks[0].status,
+                          constants.TANKALIVE)
+        self.assertEquals(added, [])
+
+    def drive(self, g, tick):
+        for color, team in sorted(g.teams.items()):
+            for tankid in xrange(len(team.tanks)):
+                team.speed(tankid, (tankid % 3 - 1) * 0.8)
+                team.angvel(tankid, ((tick // 10 + tankid) % 3 - 1) * 0.5)
+                if (tick + tankid) % 3 == 0:
+                    team.shoot(tankid)
+
+    def testForkWithShooting(self):
+        g = self.game_loop.game
+        g.teams['red'].tanks[2].kill()
+        self.assertTrue(g.teams['red'].shoot(2))
+        fork = g.fork()
+        self.assertEquals(self.state(fork), self.state(g))
+        for i in xrange(150):
+            self.drive(g, i)
+            self.drive(fork, i)
+            g.update(0.1)
+            fork.update(0.1)
+            self.assertEquals(self.state(fork), self.state(g))
+
+
+class EngineTest(unittest.TestCase):
+
+    def run_game(self, engine_name, ticks):
+        path = os.path.dirname(__file__)
+        world = "--world="+os.path.join(path, "..", "maps", "test.bzw")
+        cfg = config.Config(['--test', '--max-speed', '--seed=1', world,
+                             '--engine='+engine_name])
+        game_loop = game.GameLoop(cfg)
+        game_loop.update_game()
+        team = game_loop.game.teams['red']
+        team.speed(0, 1)
+        team.angvel(0, 0.5)
+        team.speed(1, -1)
+        for i in xrange(ticks):
+            game_loop.update_game()
+        return game_loop.game
+
+    @unittest.skipIf(engine.numpy is None, 'numpy is not installed')
+    def testNumpyMatchesPython(self):
+        python_game = self.run_game('python', 100)
+        numpy_game = self.run_game('numpy', 100)
+        self.assertTrue(isinstance(numpy_game.teams['red'].tanks[0],
+                                   game.ArrayTank))
+        for t1, t2 in zip(python_game.tanks(), numpy_game.tanks()):
+            self.assertEquals(t1.status, t2.status)
+            self.assertAlmostEqual(t1.rot, t2.rot)
+            self.assertAlmostEqual(t1.speed, t2.speed)
+            self.assertAlmostEqual(t1.pos[0], t2.pos[0])
+            self.assertAlmostEqual(t1.pos[1], t2.pos[1])
+
+    @unittest.skipIf(engine.numpy is None, 'numpy is not installed')
+    def testShotPool(self):
+        numpy_game = self.run_game('numpy', 1)
+        python_game = self.run_game('python', 1)
+        for g in numpy_game, python_game:
+            for team in g.teams.values():
+                team.speed(0, 0)
+                self.assertTrue(team.shoot(2))
+        removed = []
+        numpy_game.events.subscribe(events.REMOVE, removed.append)
+        self.assertEquals(len(list(numpy_game.shots())), 4)
+        self.assertEquals(numpy_game.shot_pool.count, 4)
+        for i in xrange(10):
+            numpy_game.update(0.02)
+            python_game.update(0.02)
+        pool_shots = sorted(s.pos for s in numpy_game.shots())
+        list_shots = sorted(s.pos for s in python_game.shots())
+        self.assertEquals(len(pool_shots), len(list_shots))
+        for p1, p2 in zip(pool_shots, list_shots):
+            self.assertAlmostEqual(p1[0], p2[0])
+            self.assertAlmostEqual(p1[1], p2[1])
+        for i in xrange(200):
+            numpy_game.update(0.02)
+        self.assertEquals(numpy_game.shot_pool.count, 0)
+        self.assertEquals(len(removed), 4)
+        self.assertEquals(len(set(removed)), 4)
+
+    def crowded_game(self, world, ticks, test_moves=True, shoot=False,
+                     pair_shots=True):
+        path = os.path.dirname(__file__)
+        cfg = config.Config(['--test', '--max-speed', '--seed=4',
+                             '--engine=numpy', '--default-tanks=20',
+                             '--world='+os.path.join(path, "..", "maps",
+                                                     world)])
+        g = game.GameLoop(cfg).game
+        if not test_moves:
+            g.tank_arrays.test_moves = lambda dt, mask: None
+        if not pair_shots:
+            # Test every shot against every tank.
+            update = g.shot_pool.update
+            g.shot_pool.update = lambda dt, contacts: update(dt, dict(
+                    (shot, list(g.tanks())) for shot in g.shots()))
+        for i in xrange(ticks):
+            for color, team in sorted(g.teams.items()):
+                for tankid in xrange(len(team.tanks)):
+                    team.speed(tankid, (tankid % 5 - 2) * 0.5)
+                    team.angvel(tankid, ((i // 20 + tankid) % 3 - 1) * 0.4)
+                    if shoot and (i + tankid) % 4 == 0:
+                        team.shoot(tankid)
+            g.update(0.1)
+        return g
+
+    def crowded_state(self, *args, **kwds):
+        g = self.crowded_game(*args, **kwds)
+        return ([(t.status, t.pos, t.rot) for t in g.tanks()] +
+                sorted(s.pos for s in g.shots()))
+
+    @unittest.skipIf(engine.numpy is None, 'numpy is not installed')
+    def testTestedMoves(self):
+        for world in 'hexmaze.bzw', 'rotated_box_world.bzw':
+            self.assertEquals(self.crowded_state(world, 150),
+                              self.crowded_state(world, 150, False))
+
+    @unittest.skipIf(engine.numpy is None, 'numpy is not installed')
+    def testShotPairs(self):
+        for world in 'hexmaze.bzw', 'four_ls.bzw':
+            paired = self.crowded_state(world, 150, shoot=True)
+            self.assertEquals(paired, self.crowded_state(
+                    world, 150, shoot=True, pair_shots=False))
+            # Some shots found their targets.
+            self.assertTrue(constants.TANKDEAD in [state[0]
+                                                   for state in paired])
+
+    @unittest.skipIf(engine.numpy is None, 'numpy is not installed')
+    def testObstacleMask(self):
+        rng = random.Random(2)
+        path = os.path.dirname(__file__)
+        for world in 'hexmaze.bzw', 'rotated_box_world.bzw':
+            cfg = config.Config(['--test', '--engine=numpy', '--world=' +
+                                 os.path.join(path, "..", "maps", world)])
+            g = game.GameLoop(cfg).game
+            # Only the obstacles and walls are in the mask.
+            tank = g.teams['red'].tanks[0]
+            tank.hits_tank = lambda pos: False
+            points = [(rng.uniform(-410, 410), rng.uniform(-410, 410))
+                      for i in xrange(3000)]
+            kinds = g.obstacle_mask.test(engine.numpy.array(points))
+            for point, kind in zip(points, kinds):
+                if kind != engine.UNKNOWN:
+                    self.assertEquals(kind == engine.BLOCKED,
+                                      tank.collision_at(point))
+            self.assertTrue((kinds == engine.UNKNOWN).mean() < 0.01)
+
+
+class StatsReportTest(unittest.TestCase):
+    """The phase timings under the logging set up by bzrflag.run."""
+
+    def setUp(self):
+        self.records = []
+        self.handler = logging.Handler()
+        self.handler.emit = self.records.append
+        root = logging.getLogger()
+        self.root_level = root.level
+        root.addHandler(self.handler)
+        root.setLevel(logging.WARNING)
+        stats.logger.setLevel(logging.NOTSET)
+
+    def tearDown(self):
+        root = logging.getLogger()
+        root.removeHandler(self.handler)
+        root.setLevel(self.root_level)
+        stats.logger.setLevel(logging.NOTSET)
+
+    def game_loop(self, *args):
+        path = os.path.dirname(__file__)
+        world = "--world="+os.path.join(path, "..", "maps", "test.bzw")
+        return game.GameLoop(config.Config(['--test', '--max-speed',
+                                            '--time-limit=2', world] +
+                                           list(args)))
+
+    def report(self):
+        return [record for record in self.records if record.name == 'stats']
+
+    def testQuietByDefault(self):
+        self.game_loop().loop()
+        self.assertEquals(self.report(), [])
+
+    def testStatsInterval(self):
+        self.game_loop('--stats-interval=0.001').loop()
+        self.assertTrue(self.report())
+
+    @unittest.skipIf(not hasattr(signal, 'SIGUSR1'), 'no SIGUSR1')
+    def testSignal(self):
+        game_loop = self.game_loop()
+        game_loop.update_game()
+        old_handler = signal.signal(signal.SIGUSR1, game_loop.report_phases)
+        try:
+            os.kill(os.getpid(), signal.SIGUSR1)
+        finally:
+            signal.signal(signal.SIGUSR1, old_handler)
+        self.assertTrue(self.report())
+
+    def testLoopInThread(self):
+        game_loop = self.game_loop()
+        errors = []
+        def run():
+            try:
+                game_loop.loop()
+            except Exception, e:
+                errors.append(e)
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        self.assertEquals(errors, [])
+        self.assertTrue(game_loop.game.end_game)
+
 # vim: et sw=4 sts=4
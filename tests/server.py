@@ -146,6 +146,27 @@ class HandlerTest(unittest.TestCase):
         self.serverRead()
         self.assertIn("ok", self.clientRead())
 
+    def testStep(self):
+        self.handshake()
+        self.clientWrite('step\n')
+        self.serverRead()
+        self.assertIn("fail", self.clientRead())
+
+    def testLockstep(self):
+        self.game.lockstep = server.Lockstep(3)
+        self.handshake()
+        self.assertFalse(self.game.lockstep.ready())
+        self.clientWrite('step\n')
+        self.serverRead()
+        self.assertNotIn("ok", self.clientRead())
+        self.assertTrue(self.game.lockstep.ready())
+        self.clientWrite('step\n')
+        self.serverRead()
+        self.assertIn("fail", self.clientRead())
+        self.game.lockstep.release()
+        self.assertEquals(self.clientRead(), 'ok\n')
+        self.assertFalse(self.game.lockstep.ready())
+
     def testTeams(self):
         self.handshake()
         self.clientWrite('teams\n')
@@ -229,6 +250,8 @@ class MockGame(object):
         self.bases = {}
         self.teams = {}
         self.obstacles = []
+        self.lockstep = None
+        self.shot_pool = None
 
     def write_msg(self, message):
         pass
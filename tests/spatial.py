@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# Bzrflag
+# Copyright 2008-2011 Brigham Young University
+#
+# This file is part of Bzrflag.
+#
+# Bzrflag is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Bzrflag is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bzrflag.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Inquiries regarding any further use of Bzrflag, please contact the Copyright
+# Licensing Office, Brigham Young University, 3760 HBLL, Provo, UT 84602,
+# (801) 422-9339 or 422-3821, e-mail copyright@byu.edu.
+
+"""Unit test for BZRFlag module spatial.py."""
+
+__author__ = "BYU AML Lab <kseppi@byu.edu>"
+__copyright__ = "Copyright 2008-2011 Brigham Young University"
+__license__ = "GNU GPL"
+
+import os
+import random
+import unittest
+
+from bzrflag import spatial, collisiontest, config, game
+
+
+class Thing(object):
+
+    def __init__(self, pos):
+        self.pos = pos
+
+
+class SpatialHashTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(0)
+        self.things = [Thing((rng.uniform(-400, 400), rng.uniform(-400, 400)))
+                       for i in xrange(300)]
+        self.grid = spatial.SpatialHash(8.64)
+        self.grid.rebuild(self.things)
+
+    def tearDown(self):
+        del self.grid
+
+    def testQueryMatchesScan(self):
+        for center in [(0, 0), (-400, 400), (123.4, -56.7)]:
+            for radius in [1, 8.64, 50]:
+                expected = set(t for t in self.things
+                    if collisiontest.get_dist(t.pos, center) <= radius)
+                found = set(t for t in self.grid.query(center, radius)
+                    if collisiontest.get_dist(t.pos, center) <= radius)
+                self.assertEquals(found, expected)
+
+    def testMoveAndRemove(self):
+        thing = self.things[0]
+        self.grid.move(thing, (1000, 1000))
+        self.assertEquals(list(self.grid.query((1000, 1000), 1)), [thing])
+        self.grid.remove(thing)
+        self.assertEquals(list(self.grid.query((1000, 1000), 1)), [])
+        self.assertEquals(len(self.grid), len(self.things) - 1)
+
+
+class NearestGridTest(unittest.TestCase):
+
+    def testNearestMatchesScan(self):
+        rng = random.Random(2)
+        points = [(i, (rng.uniform(-400, 400), rng.uniform(-400, 400)))
+                  for i in xrange(6)]
+        grid = spatial.NearestGrid(points, (800, 800), 20, 2)
+        for i in xrange(500):
+            pos = (rng.uniform(-450, 450), rng.uniform(-450, 450))
+            expected = sorted((collisiontest.get_dist(pos, p), key)
+                              for key, p in points)[:2]
+            self.assertEquals(grid.nearest(pos), expected)
+            self.assertTrue(len(grid.candidates(pos)) <= len(points))
+
+
+class SweepAndPruneTest(unittest.TestCase):
+
+    def testPairsMatchScan(self):
+        rng = random.Random(4)
+        kinds = ['tank'] * 60 + ['shot'] * 30 + ['flag'] * 4
+        pos = [[rng.uniform(-400, 400), rng.uniform(-400, 400)]
+               for kind in kinds]
+        sap = spatial.SweepAndPrune([('tank', 'tank'), ('shot', 'tank'),
+                                     ('flag', 'tank')])
+        for step in xrange(20):
+            items = []
+            for i, (kind, p) in enumerate(zip(kinds, pos)):
+                if (i + step) % 9 == 0:
+                    continue
+                p[0] += rng.uniform(-30, 30)
+                p[1] += rng.uniform(-30, 30)
+                r = rng.uniform(1, 40)
+                items.append((i, kind, (p[0] - r, p[1] - r, p[0] + r, p[1] + r)))
+            sap.update(items)
+            xs = [entry[0] for entry in sap.entries]
+            self.assertEquals(xs, sorted(xs))
+            expected = dict((k, set()) for k in sap.kinds)
+            for a, kind_a, box_a in items:
+                for b, kind_b, box_b in items:
+                    if (a != b and (kind_a, kind_b) in expected and
+                        not (kind_a == kind_b and a > b) and
+                        box_a[0] <= box_b[2] and box_b[0] <= box_a[2] and
+                        box_a[1] <= box_b[3] and box_b[1] <= box_a[3]):
+                        expected[kind_a, kind_b].add((a, b))
+            pairs = sap.pairs()
+            for kinds, found in pairs.items():
+                if kinds[0] == kinds[1]:
+                    found = [tuple(sorted(pair)) for pair in found]
+                self.assertEquals(len(found), len(set(found)))
+                self.assertEquals(set(found), expected[kinds])
+
+
+class ObstacleTreeTest(unittest.TestCase):
+
+    def setUp(self):
+        path = os.path.dirname(__file__)
+        world = os.path.join(path, "..", "maps", "hexmaze.bzw")
+        cfg = config.Config(['--world=' + world])
+        self.obstacles = [game.Box(i) for i in cfg.world.boxes]
+        self.tree = spatial.ObstacleTree(self.obstacles)
+        rng = random.Random(1)
+        self.points = [(rng.uniform(-400, 400), rng.uniform(-400, 400))
+                       for i in xrange(200)]
+
+    def tearDown(self):
+        del self.tree
+
+    def testCircle(self):
+        for pos in self.points:
+            expected = [o for o in self.obstacles
+                        if collisiontest.circle_to_poly((pos, 4.32), o.shape)]
+            found = list(self.tree.circle(pos, 4.32))
+            self.assertEquals(set(found), set(expected))
+
+    def testPoint(self):
+        for pos in self.points:
+            expected = [o for o in self.obstacles
+                        if collisiontest.point_in_poly(pos, o.shape)]
+            self.assertEquals(set(self.tree.point(pos)), set(expected))
+
+    def testSegment(self):
+        for p1, p2 in zip(self.points, self.points[1:]):
+            expected = [o for o in self.obstacles
+                        if collisiontest.line_cross_poly((p1, p2), o.shape)]
+            self.assertEquals(set(self.tree.segment(p1, p2)), set(expected))
+
+
+class ObstacleRasterTest(unittest.TestCase):
+
+    def setUp(self):
+        path = os.path.dirname(__file__)
+        world = os.path.join(path, "..", "maps", "rotated_box_world.bzw")
+        cfg = config.Config(['--world=' + world])
+        self.obstacles = [game.Box(i) for i in cfg.world.boxes]
+        self.tree = spatial.ObstacleTree(self.obstacles)
+        rng = random.Random(3)
+        self.points = [(rng.uniform(-420, 420), rng.uniform(-420, 420))
+                       for i in xrange(2000)]
+        # Points on the raster's grid lines and the obstacles' corners.
+        self.points += [(x, y) for x in xrange(-400, 400, 40)
+                        for y in xrange(-400, 400, 8)]
+        for o in self.obstacles:
+            self.points.extend(tuple(p) for p in o.shape)
+
+    def testContains(self):
+        for cell_size in 4, 7.5:
+            raster = spatial.ObstacleRaster(self.tree, (800, 800), cell_size)
+            for pos in self.points:
+                expected = any(collisiontest.point_in_poly(pos, o.shape)
+                               for o in self.obstacles)
+                self.assertEquals(raster.contains(pos), expected)
+
+    def testHitsCircle(self):
+        raster = spatial.ObstacleRaster(self.tree, (800, 800), 4)
+        for pos in self.points:
+            for radius in 0.5, 4.32, 20:
+                expected = any(collisiontest.circle_to_poly((pos, radius),
+                                                            o.shape)
+                               for o in self.obstacles)
+                self.assertEquals(raster.hits_circle(pos, radius), expected)
+
+# vim: et sw=4 sts=4
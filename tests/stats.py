@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# Bzrflag
+# Copyright 2008-2011 Brigham Young University
+#
+# This file is part of Bzrflag.
+#
+# Bzrflag is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Bzrflag is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bzrflag.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Inquiries regarding any further use of Bzrflag, please contact the Copyright
+# Licensing Office, Brigham Young University, 3760 HBLL, Provo, UT 84602,
+# (801) 422-9339 or 422-3821, e-mail copyright@byu.edu.
+
+"""Unit test for BZRFlag module stats.py."""
+
+__author__ = "BYU AML Lab <kseppi@byu.edu>"
+__copyright__ = "Copyright 2008-2011 Brigham Young University"
+__license__ = "GNU GPL"
+
+import unittest
+
+from bzrflag import stats
+
+
+class PhasesTest(unittest.TestCase):
+
+    def testRollingPercentiles(self):
+        phases = stats.Phases(size=100)
+        for i in xrange(1, 301):
+            phases.record('update', i / 1000.0)
+        phases.record('sockets', 0.5)
+        summary = phases.summary()
+        row = summary['update']
+        self.assertEquals(row['count'], 300)
+        # Only the last 100 samples, 0.201 to 0.300, are kept.
+        self.assertAlmostEqual(row['p50'], 0.250)
+        self.assertAlmostEqual(row['p95'], 0.295)
+        self.assertAlmostEqual(row['p99'], 0.299)
+        self.assertAlmostEqual(row['max'], 0.300)
+        self.assertEquals(summary['sockets']['p50'], 0.5)
+        lines = phases.lines()
+        self.assertEquals(len(lines), 2)
+        self.assertTrue(lines[0].startswith('update'))
+
+# vim: et sw=4 sts=4
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# Bzrflag
+# Copyright 2008-2011 Brigham Young University
+#
+# This file is part of Bzrflag.
+#
+# Bzrflag is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Bzrflag is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bzrflag.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Inquiries regarding any further use of Bzrflag, please contact the Copyright
+# Licensing Office, Brigham Young University, 3760 HBLL, Provo, UT 84602,
+# (801) 422-9339 or 422-3821, e-mail copyright@byu.edu.
+
+"""Unit test for BZRFlag module timers.py."""
+
+__author__ = "BYU AML Lab <kseppi@byu.edu>"
+__copyright__ = "Copyright 2008-2011 Brigham Young University"
+__license__ = "GNU GPL"
+import unittest
+
+from bzrflag import timers
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timers = timers.Scheduler()
+        self.fired = []
+
+    def tearDown(self):
+        del self.timers
+
+    def record(self, name):
+        self.fired.append((name, self.timers.now))
+
+    def testOrder(self):
+        self.timers.schedule(3, self.record, 'c')
+        self.timers.schedule(1, self.record, 'a')
+        self.timers.schedule(1, self.record, 'b')
+        self.timers.advance(0.5)
+        self.assertEquals(self.fired, [])
+        self.timers.advance(10)
+        self.assertEquals(self.fired, [('a', 1), ('b', 1), ('c', 3)])
+        self.assertEquals(self.timers.now, 10.5)
+
+    def testCancel(self):
+        event = self.timers.schedule(1, self.record, 'a')
+        self.assertEquals(len(self.timers), 1)
+        self.timers.cancel(event)
+        self.timers.cancel(event)
+        self.assertEquals(len(self.timers), 0)
+        self.timers.advance(2)
+        self.assertEquals(self.fired, [])
+
+    def testRepeatWithinStep(self):
+        def tick():
+            self.record('tick')
+            self.timers.schedule(2, tick)
+        self.timers.schedule(2, tick)
+        self.timers.advance(7)
+        self.assertEquals(self.fired, [('tick', 2), ('tick', 4), ('tick', 6)])
+        self.assertEquals(len(self.timers), 1)
+
+
+class GovernorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.polls = []
+        self.governor = timers.Governor(10, clock=lambda: self.now)
+
+    def poll(self, timeout):
+        # Pretend a socket event arrives after at most 0.03 seconds.
+        self.polls.append(timeout)
+        self.now += min(timeout, 0.03)
+
+    def testPacing(self):
+        for i in xrange(5):
+            self.governor.wait(self.poll)
+        self.assertAlmostEqual(self.now, 0.5)
+        self.assertAlmostEqual(self.polls[0], 0.1)
+        self.assertAlmostEqual(self.governor.rate, 10)
+        self.assertAlmostEqual(self.governor.jitter, 0)
+
+    def testBehind(self):
+        self.governor.wait(self.poll)
+        self.now += 0.35
+        self.governor.wait(self.poll)
+        self.assertAlmostEqual(self.now, 0.45)
+        self.governor.wait(self.poll)
+        self.assertAlmostEqual(self.now, 0.55)
+        self.assertTrue(self.governor.jitter > 0.1)
+
+# vim: et sw=4 sts=4